@@ -2,14 +2,15 @@ import logging
 
 from django.conf import settings
 from django.contrib import admin
+from django.http import Http404, JsonResponse
 from django.shortcuts import render
-from django.urls import path
+from django.urls import path, re_path
 from django.utils.module_loading import import_string
 from django.utils.translation import gettext_lazy as _
 
 from ..metric_collection.helper import MetricCollectionAdminSiteHelper
 from . import settings as app_settings
-from .dashboard import get_dashboard_context
+from .dashboard import DASHBOARD_CHARTS, get_chart_context, get_dashboard_context
 from .system_info import (
     get_enabled_openwisp_modules,
     get_openwisp_version,
@@ -39,6 +40,13 @@ class OpenwispAdminSite(admin.AdminSite):
         self.metric_collection.show_consent_info(request)
         return super().index(request, extra_context=context)
 
+    def dashboard_chart(self, request, position):
+        """Returns the data of a dashboard chart in JSON format."""
+        position = int(position)
+        if not app_settings.ADMIN_DASHBOARD_ENABLED or position not in DASHBOARD_CHARTS:
+            raise Http404()
+        return JsonResponse(get_chart_context(DASHBOARD_CHARTS[position], request))
+
     def openwisp_info(self, request, *args, **kwargs):
         context = {
             "enabled_openwisp_modules": get_enabled_openwisp_modules(),
@@ -58,6 +66,11 @@ class OpenwispAdminSite(admin.AdminSite):
                 self.admin_view(autocomplete_view.as_view(admin_site=self)),
                 name="ow-auto-filter",
             ),
+            re_path(
+                r"^dashboard-chart/(?P<position>-?\d+)/$",
+                self.admin_view(self.dashboard_chart),
+                name="ow-dashboard-chart",
+            ),
             path(
                 "openwisp-system-info/",
                 self.admin_view(self.openwisp_info),
@@ -5,7 +5,7 @@ from django.utils.translation import gettext_lazy as _
 from . import settings as app_settings
 from . import theme
 from .checks import admin_theme_settings_checks
-from .menu import register_menu_group
+from .menu import connect_menu_cache_signals, register_menu_group
 
 
 def _staticfy(value):
@@ -36,10 +36,15 @@ def _staticfy(value):
 class OpenWispAdminThemeConfig(AppConfig):
     app_label = "openwisp_admin"
     name = "openwisp_utils.admin_theme"
+    default_auto_field = "django.db.models.BigAutoField"
 
     def ready(self):
         admin_theme_settings_checks(self)
         self.register_menu_groups()
+        connect_menu_cache_signals()
+        from .views import connect_autocomplete_cache_signals
+
+        connect_autocomplete_cache_signals()
         self.modify_admin_theme_settings_links()
         # monkey patch django.contrib.admin.apps.AdminConfig.default_site
         # in order to supply our customized admin site class
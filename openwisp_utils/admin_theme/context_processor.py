@@ -4,27 +4,33 @@ import sys
 from django.apps import registry
 from django.conf import settings
 from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
 
 from ..admin_theme.menu import build_menu_groups
 from . import theme
 
 
 def menu_groups(request):
-    menu = build_menu(request)
-    if menu and sys.argv[1:2] != ["test"]:
-        logging.warning(
-            "register_menu_items is deprecated. Please update to use register_menu_group"
-        )
-    menu_groups = build_menu_groups(request)
+    # menus are built only if the template accesses them,
+    # responses which do not render the menu pay nothing
     return {
-        "openwisp_menu_items": menu,
-        "openwisp_menu_groups": menu_groups,
+        "openwisp_menu_items": SimpleLazyObject(lambda: _build_legacy_menu(request)),
+        "openwisp_menu_groups": SimpleLazyObject(lambda: build_menu_groups(request)),
         "show_userlinks_block": getattr(
             settings, "OPENWISP_ADMIN_SHOW_USERLINKS_BLOCK", False
         ),
     }
 
 
+def _build_legacy_menu(request):
+    menu = build_menu(request)
+    if menu and sys.argv[1:2] != ["test"]:
+        logging.warning(
+            "register_menu_items is deprecated. Please update to use register_menu_group"
+        )
+    return menu
+
+
 def build_menu(request):
     default_items = getattr(settings, "OPENWISP_DEFAULT_ADMIN_MENU_ITEMS", [])
     custom_items = getattr(settings, "OPENWISP_ADMIN_MENU_ITEMS", [])
@@ -0,0 +1,235 @@
+"""Counter tables of materialized dashboard charts.
+
+The counts of ``group_by`` dashboard charts which are declared as
+``materialized`` are stored in the :class:`DashboardChartCounter`
+table, which is updated in the background by the
+``update_dashboard_chart_counters`` celery task whenever objects of the
+chart model are saved or deleted, so that the dashboard reads only one
+row per organization and group instead of scanning the chart model.
+"""
+
+from django.core.cache import caches
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from . import settings as app_settings
+from .models import DashboardChartCounter
+
+# updates the counters of all the organizations,
+# while None stands for objects without organization
+ALL_ORGANIZATIONS = "__all__"
+
+
+def _get_dispatch_uid(chart, signal_name):
+    return f"dashboard_chart_counter_{signal_name}_{chart.counter_key}"
+
+
+def connect_chart_counter_signals(chart):
+    sender = f"{chart.app_label}.{chart.model_name}"
+
+    def pre_save_receiver(instance, update_fields=None, **kwargs):
+        chart_counter_pre_save_receiver(chart, instance, update_fields)
+
+    def receiver(instance, update_fields=None, **kwargs):
+        chart_counter_receiver(chart, instance, update_fields)
+
+    pre_save.connect(
+        pre_save_receiver,
+        sender=sender,
+        weak=False,
+        dispatch_uid=_get_dispatch_uid(chart, "pre_save"),
+    )
+    post_save.connect(
+        receiver,
+        sender=sender,
+        weak=False,
+        dispatch_uid=_get_dispatch_uid(chart, "post_save"),
+    )
+    post_delete.connect(
+        receiver,
+        sender=sender,
+        weak=False,
+        dispatch_uid=_get_dispatch_uid(chart, "post_delete"),
+    )
+
+
+def disconnect_chart_counter_signals(chart):
+    sender = f"{chart.app_label}.{chart.model_name}"
+    pre_save.disconnect(
+        sender=sender, dispatch_uid=_get_dispatch_uid(chart, "pre_save")
+    )
+    post_save.disconnect(
+        sender=sender, dispatch_uid=_get_dispatch_uid(chart, "post_save")
+    )
+    post_delete.disconnect(
+        sender=sender, dispatch_uid=_get_dispatch_uid(chart, "post_delete")
+    )
+
+
+def _get_instance_organization_id(chart, instance):
+    """Returns the organization of ``instance``.
+
+    Returns ``None`` if ``instance`` does not have an organization and
+    ``ALL_ORGANIZATIONS`` if the organization cannot be determined.
+    """
+    org_field = chart.get_organization_field()
+    if not org_field:
+        return ALL_ORGANIZATIONS
+    value = instance
+    try:
+        for attr in org_field.split(LOOKUP_SEP):
+            if value is None:
+                break
+            value = getattr(value, attr)
+    except (AttributeError, ObjectDoesNotExist):
+        return ALL_ORGANIZATIONS
+    return None if value is None else str(value)
+
+
+def _is_relevant_save(chart, update_fields):
+    return update_fields is None or bool(
+        set(update_fields) & chart.counter_dependencies
+    )
+
+
+def chart_counter_pre_save_receiver(chart, instance, update_fields=None):
+    """Stores the organization ``instance`` had before being saved.
+
+    Used by :func:`chart_counter_receiver` to update the counters of
+    both organizations when an object is moved to another organization.
+    """
+    org_field = chart.get_organization_field()
+    if (
+        not org_field
+        or instance._state.adding
+        or instance.pk is None
+        or not _is_relevant_save(chart, update_fields)
+    ):
+        return
+    previous = (
+        chart.model._base_manager.using(instance._state.db)
+        .filter(pk=instance.pk)
+        .values_list(org_field, flat=True)
+        .first()
+    )
+    previous_organizations = instance.__dict__.setdefault(
+        "_chart_counter_previous_organizations", {}
+    )
+    previous_organizations[chart.counter_key] = (
+        None if previous is None else str(previous)
+    )
+
+
+def chart_counter_receiver(chart, instance, update_fields=None):
+    """Schedules the update of the counters affected by ``instance``."""
+    if not _is_relevant_save(chart, update_fields):
+        return
+    organization_id = _get_instance_organization_id(chart, instance)
+    schedule_chart_counter_update(chart, organization_id)
+    previous_organization_id = instance.__dict__.get(
+        "_chart_counter_previous_organizations", {}
+    ).pop(chart.counter_key, organization_id)
+    if previous_organization_id != organization_id:
+        schedule_chart_counter_update(chart, previous_organization_id)
+
+
+def _get_lock_key(chart, organization_id):
+    return f"ow-dashboard-counter-{chart.counter_key}-{organization_id}"
+
+
+def schedule_chart_counter_update(chart, organization_id=ALL_ORGANIZATIONS):
+    """Schedules the update of the counters of a chart after commit.
+
+    Updates are debounced: if an update of the same counters is already
+    scheduled, no other task is sent to the celery workers.
+    ``organization_id=None`` updates the counters of the objects which do
+    not have an organization.
+    """
+    from .tasks import update_dashboard_chart_counters
+
+    def _schedule():
+        delay = app_settings.DASHBOARD_COUNTERS_DELAY
+        cache = caches[app_settings.DASHBOARD_CACHE]
+        if not cache.add(_get_lock_key(chart, organization_id), True, delay + 60):
+            return
+        update_dashboard_chart_counters.apply_async(
+            args=[chart.position, organization_id], countdown=delay
+        )
+
+    transaction.on_commit(_schedule)
+
+
+def update_chart_counters(chart, organization_id=ALL_ORGANIZATIONS):
+    """Re-computes the counters of a materialized dashboard chart.
+
+    If ``organization_id`` is ``ALL_ORGANIZATIONS``, the counters of all
+    the organizations are re-computed, if it is ``None`` only the
+    counters of the objects which do not have an organization are.
+    """
+    caches[app_settings.DASHBOARD_CACHE].delete(_get_lock_key(chart, organization_id))
+    org_field = chart.get_organization_field()
+    qs = chart.model.objects.filter(**chart.get_filter())
+    counters = DashboardChartCounter.objects.filter(chart=chart.counter_key)
+    full_update = not org_field or organization_id == ALL_ORGANIZATIONS
+    if not full_update:
+        if organization_id is None:
+            qs = qs.filter(**{f"{org_field}{LOOKUP_SEP}isnull": True})
+        else:
+            qs = qs.filter(**{org_field: organization_id})
+        counters = counters.filter(organization_id=organization_id)
+    fields = [chart.group_by]
+    if org_field:
+        fields.append(org_field)
+    rows = qs.order_by().values(*fields).annotate(count=Count(chart.group_by))
+    new_counters = [
+        DashboardChartCounter(
+            chart=chart.counter_key,
+            organization_id=(
+                str(row[org_field])
+                if org_field and row[org_field] is not None
+                else None
+            ),
+            group=str(row[chart.group_by]),
+            count=row["count"],
+        )
+        for row in rows
+        # avoid storing an empty "None" group
+        if row["count"]
+    ]
+    if full_update:
+        # marks the counters of all the organizations as computed,
+        # updates of single organizations do not replace this row
+        new_counters.append(
+            DashboardChartCounter(
+                chart=chart.counter_key,
+                organization_id=ALL_ORGANIZATIONS,
+                group="",
+                count=0,
+            )
+        )
+    with transaction.atomic():
+        counters.delete()
+        DashboardChartCounter.objects.bulk_create(new_counters)
+
+
+def get_chart_counters(chart, request):
+    """Returns the results of a materialized chart from its counters.
+
+    The format of the results is the same of ``group_by`` charts, returns
+    ``None`` if the counters of all the organizations have not been
+    computed yet (counters computed only for single organizations, e.g.
+    after saving an object, are not complete).
+    """
+    counters = DashboardChartCounter.objects.filter(chart=chart.counter_key)
+    if not counters.filter(organization_id=ALL_ORGANIZATIONS).exists():
+        return None
+    counters = counters.exclude(organization_id=ALL_ORGANIZATIONS)
+    if not request.user.is_superuser and chart.get_organization_field():
+        counters = counters.filter(
+            organization_id__in=[str(pk) for pk in request.user.organizations_managed]
+        )
+    rows = counters.values("group").annotate(count=Sum("count")).order_by("group")
+    return [{chart.group_by: row["group"], "count": row["count"]} for row in rows]
@@ -1,15 +1,26 @@
 import copy
 import html
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import md5
 from urllib.parse import quote
 
-from django.core.exceptions import ImproperlyConfigured
-from django.db.models import Count
+from django.core.cache import caches
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db import connections
+from django.db.models import Aggregate, Count, F, Q
+from django.db.models.constants import LOOKUP_SEP
+from django.urls import reverse
+from django.utils.functional import cached_property, keep_lazy_text
 from swapper import load_model
 
 from ..utils import SortedOrderedDict
+from . import settings as app_settings
 
 DASHBOARD_CHARTS = SortedOrderedDict()
 DASHBOARD_TEMPLATES = SortedOrderedDict()
+_CACHE_MISS = object()
 
 
 def _validate_chart_config(config):
@@ -26,6 +37,7 @@ def _validate_chart_config(config):
         or "annotate" in query_params
     )
     assert not ("group_by" in query_params and "annotate" in query_params)
+    assert isinstance(query_params.get("filter", {}), dict), "filter must be a dict"
     if "annotate" in query_params:
         assert "filters" in config, "filters must be defined when using annotate"
     if quick_link:
@@ -35,6 +47,15 @@ def _validate_chart_config(config):
             assert isinstance(quick_link["custom_css_classes"], list) or isinstance(
                 quick_link["custom_css_classes"], tuple
             ), "custom_css_classes must be either a list or a tuple"
+    if config.get("materialized"):
+        assert "group_by" in query_params, "materialized charts must use group_by"
+        assert not any(
+            callable(value) for value in query_params.get("filter", {}).values()
+        ), "materialized charts cannot use callable filters"
+    if "cache_timeout" in config:
+        assert (
+            isinstance(config["cache_timeout"], int) and config["cache_timeout"] >= 0
+        ), "cache_timeout must be a positive integer"
     return config
 
 
@@ -55,7 +76,12 @@ def register_dashboard_chart(position, config):
             f'{DASHBOARD_CHARTS[position]["name"]}'
         )
     validated_config = _validate_chart_config(config)
-    DASHBOARD_CHARTS.update({position: validated_config})
+    chart = DashboardChart(position, validated_config)
+    if chart.materialized:
+        from .counters import connect_chart_counter_signals
+
+        connect_chart_counter_signals(chart)
+    DASHBOARD_CHARTS.update({position: chart})
 
 
 def unregister_dashboard_chart(name):
@@ -70,7 +96,11 @@ def unregister_dashboard_chart(name):
     else:
         raise ImproperlyConfigured(f"No such chart: {name}")
 
-    DASHBOARD_CHARTS.pop(key_to_remove)
+    chart = DASHBOARD_CHARTS.pop(key_to_remove)
+    if chart.materialized:
+        from .counters import disconnect_chart_counter_signals
+
+        disconnect_chart_counter_signals(chart)
 
 
 def _validate_template_config(config):
@@ -122,133 +152,468 @@ def unregister_dashboard_template(path):
     DASHBOARD_TEMPLATES.pop(key_to_remove)
 
 
-def get_dashboard_context(request):
-    """Loads dashboard context for the admin index view."""
-    context = {"is_popup": False, "has_permission": True, "dashboard_enabled": True}
-    config = copy.deepcopy(DASHBOARD_CHARTS)
-
-    for key, value in config.items():
-        query_params = value["query_params"]
-        app_label = query_params["app_label"]
-        model_name = query_params["model"]
-        qs_filter = query_params.get("filter")
-        group_by = query_params.get("group_by")
-        annotate = query_params.get("annotate")
-        aggregate = query_params.get("aggregate")
-        org_field = query_params.get("organization_field")
-        default_org_field = "organization_id"
+# lazy translations are escaped when they are evaluated
+_escape = keep_lazy_text(html.escape)
+
 
-        labels_i18n = value.get("labels")
+class DashboardChart(Mapping):
+    """Compiled dashboard chart.
+
+    Everything which does not depend on the request is computed once
+    when the chart is registered, the original configuration can be
+    accessed as a read-only mapping.
+    """
+
+    def __init__(self, position, config):
+        self.position = position
+        self._config = copy.deepcopy(config)
+        query_params = self._config["query_params"]
+        self.name = self._config["name"]
+        self.app_label = query_params["app_label"]
+        self.model_name = query_params["model"]
+        self.filter = tuple(query_params.get("filter", {}).items())
+        self.group_by = query_params.get("group_by")
+        self.annotate = query_params.get("annotate")
+        self.aggregate = query_params.get("aggregate")
+        self.organization_field = query_params.get("organization_field")
+        self.cache_timeout = self._config.get("cache_timeout")
+        self.materialized = bool(self._config.get("materialized"))
+        self.colors = self._config.get("colors") or {}
+        self.filters = self._config.get("filters")
+        self.main_filters = tuple(self._config.get("main_filters", {}).items())
         # HTML escape labels defined in configuration to prevent breaking the JS
-        if labels_i18n:
-            for label_key, label_value in labels_i18n.items():
-                labels_i18n[label_key] = html.escape(label_value)
+        self.labels = None
+        if "labels" in self._config:
+            self.labels = {
+                key: _escape(value) for key, value in self._config["labels"].items()
+            }
+        self.context = {
+            key: value
+            for key, value in self._config.items()
+            if key not in ("main_filters", "cache_timeout", "materialized")
+        }
+        if self.labels is not None:
+            self.context["labels"] = self.labels
+        self._target_link = None
+        if not any(callable(value) for _, value in self.main_filters):
+            self._target_link = self._build_target_link()
+
+    def __getitem__(self, key):
+        return self._config[key]
+
+    def __iter__(self):
+        return iter(self._config)
 
+    def __len__(self):
+        return len(self._config)
+
+    @cached_property
+    def model(self):
         try:
-            model = load_model(app_label, model_name)
+            return load_model(self.app_label, self.model_name)
         except ImproperlyConfigured:
             raise ImproperlyConfigured(
-                f"Error adding dashboard element {key}."
-                f"REASON: {app_label}.{model_name} could not be loaded."
+                f"Error adding dashboard element {self.position}."
+                f"REASON: {self.app_label}.{self.model_name} could not be loaded."
             )
 
-        qs = model.objects
-        if qs_filter:
-            for field, lookup_value in qs_filter.items():
-                if callable(lookup_value):
-                    qs_filter[field] = lookup_value()
-            qs = qs.filter(**qs_filter)
-
-        # Filter query according to organization of user
-        if not request.user.is_superuser and (
-            org_field or hasattr(model, default_org_field)
-        ):
-            org_field = org_field or default_org_field
-            qs = qs.filter(**{f"{org_field}__in": request.user.organizations_managed})
-
-        annotate_kwargs = {}
-        if group_by:
-            annotate_kwargs["count"] = Count(group_by)
-            qs = qs.values(group_by)
-        if annotate:
-            annotate_kwargs.update(annotate)
-
-        qs = qs.annotate(**annotate_kwargs)
-
-        if aggregate:
-            qs = qs.aggregate(**aggregate)
-
-        # Organize data for representation using Plotly.js
-        # Create a list of labels and values from the queryset
-        # where each element in the form of
-        # {group_by : '<label>', 'count': <value>}
-        values = []
-        labels = []
-        colors = []
-        filters = []
-        main_filters = []
+    @cached_property
+    def model_label(self):
+        return f"{self.app_label}.{self.model_name}"
+
+    @cached_property
+    def counter_key(self):
+        """Identifies the counters of materialized charts.
+
+        Derived from the query of the chart, so that changing the query
+        does not reuse counters computed for a different query.
+        """
+        query = repr((self.group_by, self.organization_field, sorted(self.filter)))
+        digest = md5(query.encode(), usedforsecurity=False).hexdigest()[:12]
+        return f"{self.model_label}.{self.group_by}-{digest}"[-128:]
+
+    @cached_property
+    def counter_dependencies(self):
+        """Names of the fields which affect the counters of the chart."""
+        lookups = [self.group_by, self.get_organization_field() or ""]
+        lookups.extend(lookup for lookup, _ in self.filter)
+        dependencies = set()
+        for lookup in filter(None, lookups):
+            name = lookup.split(LOOKUP_SEP)[0]
+            dependencies.add(name)
+            # update_fields can contain either the name or the attname
+            try:
+                field = self.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            dependencies.update({field.name, getattr(field, "attname", field.name)})
+        return dependencies
+
+    def get_filter(self):
+        return {
+            field: lookup_value() if callable(lookup_value) else lookup_value
+            for field, lookup_value in self.filter
+        }
+
+    def get_organization_field(self):
+        default_org_field = "organization_id"
+        if self.organization_field or hasattr(self.model, default_org_field):
+            return self.organization_field or default_org_field
+        return None
+
+    def get_target_link(self):
+        if self._target_link is not None:
+            return self._target_link
+        return self._build_target_link()
+
+    def _build_target_link(self):
+        target_link = f"/admin/{self.app_label}/{self.model_name}/"
         url_operator = "?"
-        value["target_link"] = f"/admin/{app_label}/{model_name}/"
-        if value.get("main_filters"):
-            for main_filter_key, main_filter_value in value["main_filters"].items():
+        if self.main_filters:
+            main_filters = []
+            for main_filter_key, main_filter_value in self.main_filters:
                 if callable(main_filter_value):
                     main_filter_value = str(main_filter_value())
                 main_filters.append(f"{main_filter_key}={main_filter_value}")
-
-            value["target_link"] = "{path}?{main_filters}".format(
-                path=value["target_link"], main_filters="&".join(main_filters)
+            target_link = "{path}?{main_filters}".format(
+                path=target_link, main_filters="&".join(main_filters)
             )
-            value.pop("main_filters", None)
             url_operator = "&"
-
-        if group_by:
-            for obj in qs:
-                # avoid showing an empty "None" label
-                if obj["count"] == 0:
-                    continue
-                qs_key = str(obj[group_by])
-                label = qs_key
-                # add URL quoted label to filters
-                filters.append(quote(label, safe=""))
-                # get human readable label if predefined labels are available
-                # otherwise use the result got from the DB
-                if labels_i18n and qs_key in labels_i18n:
-                    label = labels_i18n[qs_key]
-                else:
-                    # HTML escape labels coming from values in the DB
-                    # to avoid possible XSS attacks caused by
-                    # malicious DB values set by users
-                    label = html.escape(label)
-                labels.append(label)
-                # use predefined colors if available,
-                # otherwise the JS lib will choose automatically
-                if value.get("colors") and qs_key in value["colors"]:
-                    colors.append(value["colors"][qs_key])
-                values.append(obj["count"])
-            value["target_link"] = "{path}{url_operator}{group_by}__exact=".format(
-                path=value["target_link"], url_operator=url_operator, group_by=group_by
+        if self.group_by:
+            target_link = "{path}{url_operator}{group_by}__exact=".format(
+                path=target_link, url_operator=url_operator, group_by=self.group_by
             )
+        elif self.aggregate and self.filters:
+            target_link = "{path}{url_operator}{filter_key}=".format(
+                url_operator=url_operator,
+                path=target_link,
+                filter_key=self.filters["key"],
+            )
+        return target_link
+
+
+def _get_chart_cache_key(chart, request):
+    """Returns the cache key of the query results of a dashboard chart.
+
+    Results depend on the organizations managed by the user, hence the
+    key includes a digest of the set of organizations (superusers see
+    the results of all the organizations).
+    """
+    if request.user.is_superuser:
+        organizations = "__all__"
+    else:
+        organizations = ",".join(
+            sorted(str(pk) for pk in request.user.organizations_managed)
+        )
+    digest = md5(organizations.encode(), usedforsecurity=False).hexdigest()
+    return f"ow-dashboard-chart-{chart.position}-{chart.model_label}-{digest}"
+
+
+def _get_chart_cache_timeout(chart):
+    if chart.cache_timeout is not None:
+        return chart.cache_timeout
+    return app_settings.DASHBOARD_CACHE_TIMEOUT
+
+
+def _get_chart_base_queryset(chart, request):
+    qs = chart.model.objects.all()
+    # Filter query according to organization of user
+    org_field = chart.get_organization_field()
+    if not request.user.is_superuser and org_field:
+        qs = qs.filter(**{f"{org_field}__in": request.user.organizations_managed})
+    return qs
+
 
-        if aggregate:
-            for qs_key, qs_value in qs.items():
-                if not qs_value:
-                    continue
-                labels.append(labels_i18n[qs_key])
-                values.append(qs_value)
-                colors.append(value["colors"][qs_key])
-                if value.get("filters"):
-                    filters.append(value["filters"][qs_key])
-            if value.get("filters"):
-                value["target_link"] = "{path}{url_operator}{filter_key}=".format(
-                    url_operator=url_operator,
-                    path=value["target_link"],
-                    filter_key=value["filters"]["key"],
-                )
-
-        value["query_params"] = {"values": values, "labels": labels}
-        value["colors"] = colors
-        if filters:
-            value["filters"] = filters
+def _get_chart_queryset(chart, request):
+    qs = _get_chart_base_queryset(chart, request)
+    qs_filter = chart.get_filter()
+    if qs_filter:
+        qs = qs.filter(**qs_filter)
+
+    annotate_kwargs = {}
+    if chart.group_by:
+        annotate_kwargs["count"] = Count(chart.group_by)
+        qs = qs.values(chart.group_by)
+    if chart.annotate:
+        annotate_kwargs.update(chart.annotate)
+    return qs.annotate(**annotate_kwargs)
+
+
+def _execute_chart_query(chart, request):
+    """Executes the query of a dashboard chart and returns its results.
+
+    Returns a list of ``{group_by: <label>, "count": <value>}`` dicts
+    for ``group_by`` charts, the aggregation ``dict`` for ``aggregate``
+    charts or ``None`` if the chart does not need any query result.
+    """
+    if chart.materialized:
+        from .counters import get_chart_counters, schedule_chart_counter_update
+
+        result = get_chart_counters(chart, request)
+        if result is not None:
+            return result
+        # the counters have not been computed yet
+        schedule_chart_counter_update(chart)
+    qs = _get_chart_queryset(chart, request)
+    if chart.aggregate:
+        return qs.aggregate(**chart.aggregate)
+    if chart.group_by:
+        return list(qs)
+    return None
+
+
+def _get_referenced_fields(expression):
+    """Yields the field lookups referenced by a query expression."""
+    if isinstance(expression, F):
+        yield expression.name
+        return
+    if isinstance(expression, Q):
+        for child in expression.children:
+            if isinstance(child, tuple):
+                yield child[0]
+                child = child[1]
+            yield from _get_referenced_fields(child)
+        return
+    if hasattr(expression, "get_source_expressions"):
+        for source in expression.get_source_expressions():
+            yield from _get_referenced_fields(source)
+
+
+def _is_local_field(model, lookup):
+    """Returns ``True`` if ``lookup`` does not require any SQL join."""
+    name = lookup.split(LOOKUP_SEP)[0]
+    if name == "pk":
+        return True
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    # the attname of foreign keys (eg: organization_id) does not need joins
+    return not field.is_relation or name == getattr(field, "attname", None)
+
+
+def _is_mergeable_chart(chart):
+    """Returns ``True`` if the chart query can be merged with others.
+
+    Only ``aggregate`` charts which filter and aggregate on the columns
+    of the model table can be merged, because joins could change the
+    number of rows seen by the aggregations of the other charts.
+    """
+    if (
+        not chart.aggregate
+        or chart.group_by
+        or chart.annotate
+        or not all(isinstance(value, Aggregate) for value in chart.aggregate.values())
+    ):
+        return False
+    lookups = [lookup for lookup, _ in chart.filter]
+    for value in chart.aggregate.values():
+        lookups.extend(_get_referenced_fields(value))
+    return all(_is_local_field(chart.model, lookup) for lookup in lookups)
+
+
+def _get_chart_query_groups(charts):
+    """Groups the charts whose queries can be merged.
+
+    Returns a list of lists of charts, each list represents a single
+    database query.
+    """
+    groups = OrderedDict()
+    for chart in charts:
+        if app_settings.DASHBOARD_MERGE_QUERIES and _is_mergeable_chart(chart):
+            group_key = (chart.model, chart.get_organization_field())
+        else:
+            group_key = chart.position
+        groups.setdefault(group_key, []).append(chart)
+    return list(groups.values())
+
+
+def _execute_merged_chart_query(charts, request):
+    """Executes the queries of multiple charts in a single query.
+
+    The ``filter`` of each chart is folded into its aggregations using
+    conditional aggregation, eg: ``Count("id", filter=Q(**filter))``.
+    """
+    aggregate_kwargs = {}
+    for chart in charts:
+        qs_filter = chart.get_filter()
+        for key, expression in chart.aggregate.items():
+            expression = expression.copy()
+            if qs_filter:
+                condition = Q(**qs_filter)
+                if expression.filter is not None:
+                    condition &= expression.filter
+                expression.filter = condition
+            aggregate_kwargs[f"chart{chart.position}__{key}"] = expression
+    qs = _get_chart_base_queryset(charts[0], request)
+    merged_result = qs.aggregate(**aggregate_kwargs)
+    return {
+        chart.position: {
+            key: merged_result[f"chart{chart.position}__{key}"]
+            for key in chart.aggregate
+        }
+        for chart in charts
+    }
+
+
+def _execute_chart_queries(charts, request):
+    if len(charts) > 1:
+        return _execute_merged_chart_query(charts, request)
+    return {chart.position: _execute_chart_query(chart, request) for chart in charts}
+
+
+def _get_cached_chart_query_result(chart, request):
+    if not _get_chart_cache_timeout(chart):
+        return _CACHE_MISS
+    cache = caches[app_settings.DASHBOARD_CACHE]
+    return cache.get(_get_chart_cache_key(chart, request), _CACHE_MISS)
+
+
+def _cache_chart_query_result(chart, request, result):
+    timeout = _get_chart_cache_timeout(chart)
+    if not timeout:
+        return
+    cache = caches[app_settings.DASHBOARD_CACHE]
+    cache.set(_get_chart_cache_key(chart, request), result, timeout)
+
+
+def get_chart_query_result(chart, request):
+    """Returns the query results of a dashboard chart.
+
+    Results are stored in the cache configured with
+    ``OPENWISP_ADMIN_DASHBOARD_CACHE`` for the amount of seconds
+    defined in the ``cache_timeout`` key of the chart configuration
+    (which defaults to ``OPENWISP_ADMIN_DASHBOARD_CACHE_TIMEOUT``),
+    a timeout of ``0`` disables caching.
+    """
+    result = _get_cached_chart_query_result(chart, request)
+    if result is _CACHE_MISS:
+        result = _execute_chart_query(chart, request)
+        _cache_chart_query_result(chart, request, result)
+    return result
+
+
+def _execute_chart_queries_in_thread(charts, request):
+    try:
+        return _execute_chart_queries(charts, request)
+    finally:
+        # each thread opens its own database connection
+        connections.close_all()
+
+
+def get_chart_query_results(charts, request):
+    """Returns the query results of multiple dashboard charts.
+
+    Returns a dict which maps the position of each chart to its results.
+    Charts which query the same model can be merged in a single query
+    (see ``OPENWISP_ADMIN_DASHBOARD_MERGE_QUERIES``). When
+    ``OPENWISP_ADMIN_DASHBOARD_CONCURRENT_QUERIES`` is greater than
+    ``1``, the queries are executed concurrently in a thread pool which
+    uses at most that number of threads.
+    """
+    results = {}
+    pending = []
+    for chart in charts:
+        result = _get_cached_chart_query_result(chart, request)
+        if result is _CACHE_MISS:
+            pending.append(chart)
+        else:
+            results[chart.position] = result
+    groups = _get_chart_query_groups(pending)
+    max_workers = min(app_settings.DASHBOARD_CONCURRENT_QUERIES, len(groups))
+    if max_workers <= 1:
+        for group in groups:
+            results.update(_execute_chart_queries(group, request))
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(_execute_chart_queries_in_thread, group, request)
+                for group in groups
+            ]
+            for future in futures:
+                results.update(future.result())
+    for chart in pending:
+        _cache_chart_query_result(chart, request, results[chart.position])
+    return results
+
+
+def get_chart_context(chart, request):
+    """Returns the data of a dashboard chart ready for Plotly.js."""
+    return _build_chart_context(chart, get_chart_query_result(chart, request))
+
+
+def _build_chart_context(chart, result):
+    value = dict(chart.context)
+    labels_i18n = chart.labels
+
+    # Organize data for representation using Plotly.js
+    # Create a list of labels and values from the queryset
+    # where each element in the form of
+    # {group_by : '<label>', 'count': <value>}
+    values = []
+    labels = []
+    colors = []
+    filters = []
+    value["target_link"] = chart.get_target_link()
+
+    if chart.group_by:
+        for obj in result:
+            # avoid showing an empty "None" label
+            if obj["count"] == 0:
+                continue
+            qs_key = str(obj[chart.group_by])
+            label = qs_key
+            # add URL quoted label to filters
+            filters.append(quote(label, safe=""))
+            # get human readable label if predefined labels are available
+            # otherwise use the result got from the DB
+            if labels_i18n and qs_key in labels_i18n:
+                label = labels_i18n[qs_key]
+            else:
+                # HTML escape labels coming from values in the DB
+                # to avoid possible XSS attacks caused by
+                # malicious DB values set by users
+                label = html.escape(label)
+            labels.append(label)
+            # use predefined colors if available,
+            # otherwise the JS lib will choose automatically
+            if qs_key in chart.colors:
+                colors.append(chart.colors[qs_key])
+            values.append(obj["count"])
+
+    if chart.aggregate:
+        for qs_key, qs_value in result.items():
+            if not qs_value:
+                continue
+            labels.append(labels_i18n[qs_key])
+            values.append(qs_value)
+            colors.append(chart.colors[qs_key])
+            if chart.filters:
+                filters.append(chart.filters[qs_key])
+
+    value["query_params"] = {"values": values, "labels": labels}
+    value["colors"] = colors
+    if filters:
+        value["filters"] = filters
+    return value
+
+
+def get_dashboard_context(request):
+    """Loads dashboard context for the admin index view."""
+    context = {"is_popup": False, "has_permission": True, "dashboard_enabled": True}
+    config = OrderedDict()
+    if app_settings.DASHBOARD_ASYNC_CHARTS:
+        # the data of the charts is fetched by the
+        # browser after the page has been rendered
+        for key, chart in DASHBOARD_CHARTS.items():
+            config[key] = {
+                "name": str(chart.name),
+                "data_url": reverse("admin:ow-dashboard-chart", args=[key]),
+            }
+    else:
+        results = get_chart_query_results(DASHBOARD_CHARTS.values(), request)
+        for key, chart in DASHBOARD_CHARTS.items():
+            config[key] = _build_chart_context(chart, results[key])
 
     # dashboard templates
     extra_config = {}
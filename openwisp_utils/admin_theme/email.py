@@ -1,10 +1,18 @@
 import logging
-from smtplib import SMTPRecipientsRefused
+import time
+from functools import lru_cache
+from smtplib import (
+    SMTPException,
+    SMTPRecipientsRefused,
+    SMTPResponseException,
+    SMTPServerDisconnected,
+)
 
 from django.conf import settings
 from django.contrib.sites.shortcuts import get_current_site
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import get_template
 from django.utils.html import strip_tags
 
 from . import settings as app_settings
@@ -12,16 +20,25 @@ from . import settings as app_settings
 logger = logging.getLogger(__name__)
 
 
-def send_email(
+def _get_site_context():
+    site = get_current_site(None)
+    scheme = "http" if settings.DEBUG else "https"
+    return dict(
+        site_name=site.name,
+        site_url=f"{scheme}://{site.domain}",
+        logo_url=app_settings.OPENWISP_EMAIL_LOGO,
+    )
+
+
+def _build_email(
     subject,
     body_text,
     body_html,
     recipients,
-    extra_context=None,
-    html_email_template="openwisp_utils/email_template.html",
+    extra_context,
+    get_html_context,
     **kwargs,
 ):
-    extra_context = extra_context or {}
     mail = EmailMultiAlternatives(
         subject=subject,
         body=strip_tags(body_text),
@@ -30,24 +47,183 @@ def send_email(
         **kwargs,
     )
     if app_settings.OPENWISP_HTML_EMAIL and body_html:
-        site = get_current_site(None)
-        scheme = "http" if settings.DEBUG else "https"
+        template, site_context = get_html_context()
         context = dict(
             title=subject,
             message=body_html,
-            site_name=site.name,
-            site_url=f"{scheme}://{site.domain}",
-            logo_url=app_settings.OPENWISP_EMAIL_LOGO,
             recipients=", ".join(recipients),
+            **site_context,
         )
-        context.update(extra_context)
+        context.update(extra_context or {})
+        mail.attach_alternative(template.render(context), "text/html")
+    return mail
 
-        html_message = render_to_string(
-            html_email_template,
-            context=context,
-        )
-        mail.attach_alternative(html_message, "text/html")
+
+def _get_email(
+    subject,
+    body_text,
+    body_html,
+    recipients,
+    extra_context=None,
+    html_email_template="openwisp_utils/email_template.html",
+    **kwargs,
+):
+    return _build_email(
+        subject,
+        body_text,
+        body_html,
+        recipients,
+        extra_context,
+        lambda: (get_template(html_email_template), _get_site_context()),
+        **kwargs,
+    )
+
+
+def send_email(
+    subject,
+    body_text,
+    body_html,
+    recipients,
+    extra_context=None,
+    html_email_template="openwisp_utils/email_template.html",
+    queue=None,
+    **kwargs,
+):
+    if queue is None:
+        queue = app_settings.OPENWISP_EMAIL_QUEUE
+    if queue and _enqueue_email(
+        subject,
+        body_text,
+        body_html,
+        recipients,
+        extra_context=extra_context,
+        html_email_template=html_email_template,
+        **kwargs,
+    ):
+        return
+    mail = _get_email(
+        subject,
+        body_text,
+        body_html,
+        recipients,
+        extra_context,
+        html_email_template,
+        **kwargs,
+    )
     try:
         mail.send()
     except SMTPRecipientsRefused as err:
         logger.warning(f"SMTP recipients refused: {err.recipients}")
+
+
+def _enqueue_email(*args, **kwargs):
+    """Sends the email with a celery task, returns ``False`` on failure."""
+    from kombu.exceptions import EncodeError, OperationalError
+
+    from .tasks import send_queued_email
+
+    try:
+        send_queued_email.delay(*args, **kwargs)
+    except (EncodeError, OperationalError) as err:
+        # e.g.: attachments which are not JSON serializable
+        # or the message broker is not reachable
+        logger.warning(f"Email cannot be queued, sending it directly: {err}")
+        return False
+    return True
+
+
+def is_transient_smtp_error(err):
+    """Returns ``True`` if sending the email again may succeed."""
+    if isinstance(err, SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in err.recipients.values())
+    if isinstance(err, SMTPResponseException):
+        return 400 <= err.smtp_code < 500
+    if isinstance(err, SMTPServerDisconnected):
+        return True
+    # SMTPException is a subclass of OSError
+    return isinstance(err, OSError) and not isinstance(err, SMTPException)
+
+
+def get_rate_limit_delay():
+    """Counts a message sent to ``EMAIL_HOST``.
+
+    Returns the number of seconds to wait before sending the
+    message when ``OPENWISP_EMAIL_RATE_LIMIT`` has been reached,
+    ``0`` otherwise.
+    """
+    rate_limit = app_settings.OPENWISP_EMAIL_RATE_LIMIT
+    if not rate_limit:
+        return 0
+    now = time.time()
+    key = f"ow-email-rate-limit-{settings.EMAIL_HOST}-{int(now // 60)}"
+    cache.add(key, 0, timeout=120)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # the cache backend does not store values (e.g.: DummyCache)
+        return 0
+    if count <= rate_limit:
+        return 0
+    return 60 - int(now % 60)
+
+
+def send_bulk_email(
+    messages,
+    html_email_template="openwisp_utils/email_template.html",
+    connection=None,
+    **kwargs,
+):
+    """Sends many emails over a single connection to the email backend.
+
+    ``messages`` is an iterable of tuples containing the positional
+    arguments of ``send_email``, that is ``(subject, body_text, body_html,
+    recipients)`` or ``(subject, body_text, body_html, recipients,
+    extra_context)``. ``kwargs`` are passed to each email.
+
+    The HTML template and the current site are loaded once for all the
+    messages. Returns a list of ``(message, exception)`` tuples for the
+    messages which could not be sent. The connection is opened again if
+    the server closes it.
+    """
+
+    @lru_cache(maxsize=None)
+    def get_html_context():
+        return get_template(html_email_template), _get_site_context()
+
+    failures = []
+    connection = connection or get_connection()
+    # connections opened by the caller are not closed
+    new_connection = connection.open()
+    try:
+        for message in messages:
+            try:
+                mail = _build_email(
+                    *message[:4],
+                    message[4] if len(message) > 4 else None,
+                    get_html_context,
+                    connection=connection,
+                    **kwargs,
+                )
+                mail.send()
+            except Exception as err:
+                # e.g. SMTP errors, invalid headers or template errors
+                if isinstance(err, SMTPRecipientsRefused):
+                    logger.warning(f"SMTP recipients refused: {err.recipients}")
+                else:
+                    logger.warning(f"Failed to send email to {message[3]}: {err}")
+                failures.append((message, err))
+                if isinstance(err, SMTPServerDisconnected):
+                    _reopen_connection(connection)
+    finally:
+        if new_connection:
+            connection.close()
+    return failures
+
+
+def _reopen_connection(connection):
+    connection.close()
+    try:
+        connection.open()
+    except (SMTPException, OSError) as err:
+        # the next messages will try to open the connection again
+        logger.warning(f"Failed to open a connection to the email backend: {err}")
@@ -1,15 +1,24 @@
 import logging
+import weakref
+from uuid import uuid4
 
 from django.apps import registry
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
-from django.urls import reverse
+from django.urls import get_resolver, get_script_prefix, get_urlconf, reverse
 from django.urls.exceptions import NoReverseMatch
+from django.utils.translation import get_language
 
 from ..utils import SortedOrderedDict
+from . import settings as app_settings
 
 logger = logging.getLogger(__name__)
 
 MENU = SortedOrderedDict()
+# incremented each time the menu is modified,
+# used to discard menus cached before the change
+_MENU_REVISION = 0
+_MENU_VERSION_KEY = "ow-menu-version"
 
 
 class BaseMenuItem:
@@ -65,6 +74,12 @@ class ModelLink(BaseMenuItem):
         self.model = model
         self.set_label(config)
         self.icon = config.get("icon")
+        app_label, model_name = model.split(".")
+        model_label = model_name.lower()
+        self.url_name = f"admin:{app_label}_{model_label}_{name}"
+        self.view_perm = f"{app_label}.view_{model_label}"
+        self.change_perm = f"{app_label}.change_{model_label}"
+        self._resolved_urls = None
 
     def set_label(self, config=None):
         if config.get("label"):
@@ -73,20 +88,40 @@ class ModelLink(BaseMenuItem):
         model_class = registry.apps.get_model(app_label, model)
         self.label = f"{model_class._meta.verbose_name_plural} {self.name}"
 
-    def create_context(self, request):
-        app_label, model = self.model.split(".")
-        model_label = model.lower()
+    def get_url(self):
+        """Returns the URL of the link, which is resolved only once.
+
+        The resolved URLs are bound to the URL resolver which was active
+        when they were resolved: ``clear_url_caches()`` replaces the
+        resolver, hence URLs are resolved again after the URLconf is
+        changed. URLs are stored for each script prefix and language,
+        since both affect ``reverse()`` (e.g. ``i18n_patterns``).
+        """
+        resolver = get_resolver(get_urlconf())
+        key = (get_script_prefix(), get_language())
+        resolved_urls = self._resolved_urls
+        if resolved_urls is None or resolved_urls[0]() is not resolver:
+            # the resolver is referenced weakly to avoid keeping alive
+            # discarded resolvers, the new tuple is stored in a single
+            # assignment to make concurrent requests safe
+            resolved_urls = (weakref.ref(resolver), {})
+            self._resolved_urls = resolved_urls
+        elif key in resolved_urls[1]:
+            return resolved_urls[1][key]
         try:
-            url = reverse(f"admin:{app_label}_{model_label}_{self.name}")
+            url = reverse(self.url_name)
         except NoReverseMatch:
             raise NoReverseMatch(
                 f"Invalid config provided for menu."
                 f" No reverse found for the config- {self.config}"
             )
-        view_perm = f"{app_label}.view_{model_label}"
-        change_perm = f"{app_label}.change_{model_label}"
+        resolved_urls[1][key] = url
+        return url
+
+    def create_context(self, request):
+        url = self.get_url()
         user = request.user
-        if user.has_perm(view_perm) or user.has_perm(change_perm):
+        if user.has_perm(self.view_perm) or user.has_perm(self.change_perm):
             return {"label": self.label, "url": url, "icon": self.icon}
         return None
 
@@ -216,6 +251,7 @@ def register_menu_group(position, config):
         # Unknown
         raise ImproperlyConfigured(f"Invalid config provided at position {position}")
     MENU.update({position: group_class})
+    _menu_changed()
 
 
 def register_menu_subitem(group_position, item_position, config):
@@ -268,9 +304,15 @@ def register_menu_subitem(group_position, item_position, config):
             at the same position.'
         )
     group.items.update({item_position: item})
+    _menu_changed()
 
 
-def build_menu_groups(request):
+def _menu_changed():
+    global _MENU_REVISION
+    _MENU_REVISION += 1
+
+
+def _build_menu_groups(request):
     menu = []
     for position, item in MENU.items():
         item_context = item.get_context(request)
@@ -278,3 +320,120 @@ def build_menu_groups(request):
             item_context["id"] = position
             menu.append(item_context)
     return menu
+
+
+def _get_user_menu_version_key(user_pk):
+    return f"{_MENU_VERSION_KEY}-{user_pk}"
+
+
+def _get_menu_cache_key(user):
+    """Returns the cache key of the menu of ``user``.
+
+    The key contains the global menu version (changed when groups or
+    permissions are modified) and the version of the user (changed when
+    the user, its groups or its permissions are modified), hence
+    invalidating a version makes all the related cached menus unreachable.
+    """
+    version_keys = [_MENU_VERSION_KEY, _get_user_menu_version_key(user.pk)]
+    versions = cache.get_many(version_keys)
+    missing = {key: uuid4().hex for key in version_keys if key not in versions}
+    if missing:
+        # versions must never fall back to a previous value,
+        # otherwise menus cached before an invalidation would
+        # become reachable again after the eviction of a version
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return "ow-menu-{pk}-{global_version}-{user_version}-{language}-{revision}".format(
+        pk=user.pk,
+        global_version=versions[_MENU_VERSION_KEY],
+        user_version=versions[_get_user_menu_version_key(user.pk)],
+        language=get_language(),
+        revision=_MENU_REVISION,
+    )
+
+
+def build_menu_groups(request):
+    """Returns the menu items which can be accessed by ``request.user``.
+
+    When ``OPENWISP_ADMIN_MENU_CACHE_TIMEOUT`` is enabled, the menu of
+    each authenticated user is cached for the current language.
+    """
+    timeout = app_settings.MENU_CACHE_TIMEOUT
+    user = getattr(request, "user", None)
+    if not timeout or user is None or not user.is_authenticated:
+        return _build_menu_groups(request)
+    key = _get_menu_cache_key(user)
+    menu = cache.get(key)
+    if menu is None:
+        menu = _build_menu_groups(request)
+        # lazy translations are resolved before caching,
+        # the language is part of the cache key
+        for item in menu:
+            item["label"] = str(item["label"])
+            for sub_item in item.get("sub_items", []):
+                sub_item["label"] = str(sub_item["label"])
+        cache.set(key, menu, timeout)
+    return menu
+
+
+def invalidate_menu_cache(user=None):
+    """Invalidates the cached menus of ``user`` (or of all users)."""
+    if user is None:
+        key = _MENU_VERSION_KEY
+    else:
+        key = _get_user_menu_version_key(getattr(user, "pk", user))
+    cache.set(key, uuid4().hex, timeout=None)
+
+
+def _user_changed(instance, update_fields=None, **kwargs):
+    # logging in does not change what the user can access
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    invalidate_menu_cache(instance)
+
+
+def _permissions_changed(**kwargs):
+    invalidate_menu_cache()
+
+
+def connect_menu_cache_signals():
+    """Invalidates cached menus when users, groups or permissions change."""
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.models import Group, Permission
+    from django.db.models.signals import m2m_changed, post_delete, post_save
+
+    User = get_user_model()
+
+    def relation_changed(instance, action, **kwargs):
+        if action not in ("post_add", "post_remove", "post_clear"):
+            return
+        if isinstance(instance, User):
+            invalidate_menu_cache(instance)
+        else:
+            invalidate_menu_cache()
+
+    post_save.connect(_user_changed, sender=User, dispatch_uid="ow_menu_user_saved")
+    post_delete.connect(_user_changed, sender=User, dispatch_uid="ow_menu_user_deleted")
+    for model in (Group, Permission):
+        post_save.connect(
+            _permissions_changed,
+            sender=model,
+            dispatch_uid=f"ow_menu_{model._meta.model_name}_saved",
+        )
+        post_delete.connect(
+            _permissions_changed,
+            sender=model,
+            dispatch_uid=f"ow_menu_{model._meta.model_name}_deleted",
+        )
+    relations = [Group.permissions.through]
+    # custom user models may not use PermissionsMixin
+    for field_name in ("groups", "user_permissions"):
+        if hasattr(User, field_name):
+            relations.append(getattr(User, field_name).through)
+    for through in relations:
+        m2m_changed.connect(
+            relation_changed,
+            sender=through,
+            weak=False,
+            dispatch_uid=f"ow_menu_{through._meta.model_name}_changed",
+        )
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="DashboardChartCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("chart", models.CharField(max_length=128, verbose_name="chart")),
+                (
+                    "organization_id",
+                    models.CharField(
+                        blank=True,
+                        max_length=64,
+                        null=True,
+                        verbose_name="organization ID",
+                    ),
+                ),
+                ("group", models.TextField(verbose_name="group")),
+                (
+                    "count",
+                    models.PositiveBigIntegerField(default=0, verbose_name="count"),
+                ),
+                (
+                    "modified",
+                    models.DateTimeField(auto_now=True, verbose_name="modified"),
+                ),
+            ],
+            options={
+                "verbose_name": "dashboard chart counter",
+                "verbose_name_plural": "dashboard chart counters",
+                "indexes": [
+                    models.Index(
+                        fields=["chart", "organization_id"],
+                        name="admin_theme_chart_cdfd47_idx",
+                    )
+                ],
+            },
+        ),
+    ]
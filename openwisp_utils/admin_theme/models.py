@@ -0,0 +1,28 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class DashboardChartCounter(models.Model):
+    """Pre-computed counts of materialized dashboard charts.
+
+    Each row holds the number of objects of a group (a distinct value of
+    the ``group_by`` field of the chart) for a single organization.
+    An additional row with ``organization_id="__all__"`` marks the
+    counters of the chart as computed for all the organizations.
+    """
+
+    chart = models.CharField(_("chart"), max_length=128)
+    organization_id = models.CharField(
+        _("organization ID"), max_length=64, blank=True, null=True
+    )
+    group = models.TextField(_("group"))
+    count = models.PositiveBigIntegerField(_("count"), default=0)
+    modified = models.DateTimeField(_("modified"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("dashboard chart counter")
+        verbose_name_plural = _("dashboard chart counters")
+        indexes = [models.Index(fields=["chart", "organization_id"])]
+
+    def __str__(self):
+        return f"{self.chart} {self.group}: {self.count}"
@@ -9,6 +9,21 @@ ADMIN_SITE_CLASS = getattr(
 OPENWISP_ADMIN_THEME_LINKS = getattr(settings, "OPENWISP_ADMIN_THEME_LINKS", [])
 OPENWISP_ADMIN_THEME_JS = getattr(settings, "OPENWISP_ADMIN_THEME_JS", [])
 ADMIN_DASHBOARD_ENABLED = getattr(settings, "OPENWISP_ADMIN_DASHBOARD_ENABLED", True)
+DASHBOARD_ASYNC_CHARTS = getattr(
+    settings, "OPENWISP_ADMIN_DASHBOARD_ASYNC_CHARTS", False
+)
+DASHBOARD_CONCURRENT_QUERIES = getattr(
+    settings, "OPENWISP_ADMIN_DASHBOARD_CONCURRENT_QUERIES", 1
+)
+DASHBOARD_MERGE_QUERIES = getattr(
+    settings, "OPENWISP_ADMIN_DASHBOARD_MERGE_QUERIES", True
+)
+DASHBOARD_COUNTERS_DELAY = getattr(
+    settings, "OPENWISP_ADMIN_DASHBOARD_COUNTERS_DELAY", 10
+)
+DASHBOARD_CACHE = getattr(settings, "OPENWISP_ADMIN_DASHBOARD_CACHE", "default")
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, "OPENWISP_ADMIN_DASHBOARD_CACHE_TIMEOUT", 0)
+MENU_CACHE_TIMEOUT = getattr(settings, "OPENWISP_ADMIN_MENU_CACHE_TIMEOUT", 0)
 
 OPENWISP_EMAIL_LOGO = getattr(
     settings,
@@ -18,8 +33,16 @@ OPENWISP_EMAIL_LOGO = getattr(
 )
 
 OPENWISP_HTML_EMAIL = getattr(settings, "OPENWISP_HTML_EMAIL", True)
+OPENWISP_EMAIL_QUEUE = getattr(settings, "OPENWISP_EMAIL_QUEUE", False)
+OPENWISP_EMAIL_RATE_LIMIT = getattr(settings, "OPENWISP_EMAIL_RATE_LIMIT", 0)
 AUTOCOMPLETE_FILTER_VIEW = getattr(
     settings,
     "OPENWISP_AUTOCOMPLETE_FILTER_VIEW",
     "openwisp_utils.admin_theme.views.AutocompleteJsonView",
 )
+AUTOCOMPLETE_FILTER_KEYSET_PAGINATION = getattr(
+    settings, "OPENWISP_AUTOCOMPLETE_FILTER_KEYSET_PAGINATION", False
+)
+AUTOCOMPLETE_FILTER_CACHE_TIMEOUT = getattr(
+    settings, "OPENWISP_AUTOCOMPLETE_FILTER_CACHE_TIMEOUT", 0
+)
@@ -4,6 +4,8 @@ django.jQuery(document).ready(function () {
   django.jQuery("#changelist-filter select, #grp-filters select").off("change");
   django.jQuery("#changelist-filter select, #grp-filters select").off("clear");
 
+  var autocompleteDelay = 250;
+
   function setAllPlaceholder(target) {
     var allPlaceholder = gettext("All");
     django.jQuery(target).text(allPlaceholder);
@@ -29,8 +31,43 @@ django.jQuery(document).ready(function () {
       });
   }
 
+  function initAutocompleteRequests() {
+    // Requests are sent only after the user stops typing for
+    // "autocompleteDelay" milliseconds instead of on each keystroke.
+    // When keyset pagination is enabled on the server, the next page of
+    // results is requested with the "after" value returned along with
+    // the previous page instead of the page number.
+    django
+      .jQuery(".admin-autocomplete.select2-hidden-accessible")
+      .each(function (index, el) {
+        var select2 = django.jQuery(el).data("select2"),
+          dataAdapter = select2 && select2.dataAdapter,
+          after;
+        if (!dataAdapter || !dataAdapter.ajaxOptions) {
+          return;
+        }
+        var getData = dataAdapter.ajaxOptions.data,
+          processResults = dataAdapter.processResults;
+        if (!dataAdapter.ajaxOptions.delay) {
+          dataAdapter.ajaxOptions.delay = autocompleteDelay;
+        }
+        dataAdapter.ajaxOptions.data = function (params) {
+          var data = getData.call(this, params);
+          if (params.page > 1 && after) {
+            data.after = after;
+          }
+          return data;
+        };
+        dataAdapter.processResults = function (data, params) {
+          after = data.pagination && data.pagination.after;
+          return processResults.call(this, data, params);
+        };
+      });
+  }
+
   setAllPlaceholder(".auto-filter .select2-selection__placeholder");
   initSelect2NullOption();
+  initAutocompleteRequests();
 
   django.jQuery(".auto-filter").on("select2:open", function (event) {
     var optionsContainer = django
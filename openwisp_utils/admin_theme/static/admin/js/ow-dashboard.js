@@ -18,7 +18,12 @@
   let elementsParam = Object.values(owDashboardCharts),
     container = document.getElementById("plot-container");
 
-  const layout = {
+  const options = {
+    displayModeBar: false,
+  };
+
+  function getLayout(title) {
+    return {
       height: 410,
       width: 410,
       margin: {
@@ -34,31 +39,25 @@
         itemclick: false,
       },
       title: {
+        text: title,
         yanchor: "auto",
         y: 0.9,
         font: { size: 18 },
       },
-    },
-    options = {
-      displayModeBar: false,
     };
+  }
 
-  for (let i = 0; i < elementsParam.length; ++i) {
-    layout.title.text = elementsParam[i].name;
-    // Remove annotations added from previous chart.
-    // Otherwise, empty chart will show annotations from
-    // the previous chart.
-    delete layout.annotations;
-    let data = {
+  function renderChart(chart, element) {
+    let layout = getLayout(chart.name),
+      data = {
         type: "pie",
         hole: 0.55,
-        showlegend: !elementsParam[i].hasOwnProperty("quick_link"),
+        showlegend: !chart.hasOwnProperty("quick_link"),
       },
-      element = document.createElement("div"),
       totalValues = 0;
 
     // Show a graph depicting disabled graph when there is insufficient data
-    if (elementsParam[i].query_params.values.length === 0) {
+    if (chart.query_params.values.length === 0) {
       data.values = [1];
       data.labels = ["Not enough data"];
       data.marker = {
@@ -68,8 +67,8 @@
       data.showlegend = false;
       data.hovertemplate = "%{label}";
     } else {
-      data.values = elementsParam[i].query_params.values;
-      data.labels = elementsParam[i].query_params.labels;
+      data.values = chart.query_params.values;
+      data.labels = chart.query_params.labels;
 
       if (data.labels.length > 4) {
         data.showlegend = false;
@@ -78,15 +77,15 @@
       data.textposition = "inside";
       data.insidetextorientation = "horizontal";
 
-      if (elementsParam[i].colors) {
+      if (chart.colors) {
         data.marker = {
-          colors: elementsParam[i].colors,
+          colors: chart.colors,
         };
       }
       data.texttemplate = "%{percent}";
-      data.targetLink = elementsParam[i].target_link;
-      data.filters = elementsParam[i].filters;
-      data.filtering = elementsParam[i].filtering;
+      data.targetLink = chart.target_link;
+      data.filters = chart.filters;
+      data.filtering = chart.filtering;
 
       // add total to pie chart
       for (var c = 0; c < data.values.length; c++) {
@@ -108,7 +107,7 @@
 
     Plotly.newPlot(element, [data], layout, options);
 
-    if (elementsParam[i].query_params.values.length !== 0) {
+    if (chart.query_params.values.length !== 0) {
       element.on("plotly_click", function (data) {
         var path = data.points[0].data.targetLink,
           filters = data.points[0].data.filters,
@@ -126,29 +125,55 @@
     }
 
     // Add quick link button
-    if (elementsParam[i].hasOwnProperty("quick_link")) {
+    if (chart.hasOwnProperty("quick_link")) {
       let quickLinkContainer = document.createElement("div");
       quickLinkContainer.classList.add("quick-link-container");
       let quickLink = document.createElement("a");
-      quickLink.href = elementsParam[i].quick_link.url;
-      quickLink.innerHTML = elementsParam[i].quick_link.label;
-      quickLink.title =
-        elementsParam[i].quick_link.title || elementsParam[i].quick_link.label;
+      quickLink.href = chart.quick_link.url;
+      quickLink.innerHTML = chart.quick_link.label;
+      quickLink.title = chart.quick_link.title || chart.quick_link.label;
       quickLink.classList.add("button", "quick-link");
       // Add custom css classes
-      if (elementsParam[i].quick_link.custom_css_classes) {
-        for (
-          let j = 0;
-          j < elementsParam[i].quick_link.custom_css_classes.length;
-          ++j
-        ) {
-          quickLink.classList.add(elementsParam[i].quick_link.custom_css_classes[j]);
+      if (chart.quick_link.custom_css_classes) {
+        for (let j = 0; j < chart.quick_link.custom_css_classes.length; ++j) {
+          quickLink.classList.add(chart.quick_link.custom_css_classes[j]);
         }
       }
       quickLinkContainer.appendChild(quickLink);
       element.appendChild(quickLinkContainer);
     }
+  }
+
+  function loadChart(chart, element) {
+    // charts loaded asynchronously are rendered as soon as
+    // their data is returned by the server, the element is
+    // appended to the container beforehand to preserve the order
+    element.classList.add("loading");
+    fetch(chart.data_url, { credentials: "same-origin" })
+      .then(function (response) {
+        if (!response.ok) {
+          throw new Error(response.statusText);
+        }
+        return response.json();
+      })
+      .then(function (data) {
+        element.classList.remove("loading");
+        renderChart(data, element);
+      })
+      .catch(function (error) {
+        element.classList.remove("loading");
+        console.error(`Could not load dashboard chart "${chart.name}":`, error);
+      });
+  }
+
+  for (let i = 0; i < elementsParam.length; ++i) {
+    let element = document.createElement("div");
     element.classList.add(slugify(elementsParam[i].name));
     container.appendChild(element);
+    if (elementsParam[i].hasOwnProperty("data_url")) {
+      loadChart(elementsParam[i], element);
+    } else {
+      renderChart(elementsParam[i], element);
+    }
   }
 })();
@@ -1,6 +1,11 @@
 import importlib.metadata
+import os
 import platform
+import re
+import sys
 from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
 
 import distro
 from django.conf import settings
@@ -9,14 +14,76 @@ from django.utils.module_loading import import_string
 EXTRA_OPENWISP_PACKAGES = ["netdiff", "netjsonconfig"]
 
 
+# matches the directories containing the metadata of installed
+# distributions, e.g.: "openwisp_utils-1.2.0.dist-info"
+_DIST_INFO_RE = re.compile(r"^(?P<name>[^-]+)(-[^-]+)*\.(dist|egg)-info$")
+
+
+def _normalize_name(name):
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def _is_openwisp_package(name):
+    name = _normalize_name(name)
+    return name.startswith("openwisp") or name in EXTRA_OPENWISP_PACKAGES
+
+
+@lru_cache(maxsize=None)
+def _find_openwisp_distributions():
+    """Returns the metadata paths of the installed OpenWISP packages.
+
+    Only the names of the directories found in ``sys.path`` are inspected,
+    the metadata of the distributions is not parsed. The first
+    distribution found for each name is returned, as the import system
+    does.
+    """
+    distributions = {}
+    for path in sys.path:
+        try:
+            entries = list(os.scandir(path or "."))
+        except OSError:
+            continue
+        for entry in entries:
+            match = _DIST_INFO_RE.match(entry.name)
+            if not match or not _is_openwisp_package(match["name"]):
+                continue
+            distributions.setdefault(_normalize_name(match["name"]), entry.path)
+    return tuple(distributions.items())
+
+
+def get_installed_openwisp_package_names():
+    """Returns the normalized names of the installed OpenWISP packages.
+
+    Cheaper than ``get_installed_openwisp_packages`` because the metadata
+    of the packages is not parsed.
+    """
+    return [name for name, _ in _find_openwisp_distributions()]
+
+
+@lru_cache(maxsize=None)
+def _get_installed_openwisp_packages():
+    packages = {}
+    for _, path in _find_openwisp_distributions():
+        dist = importlib.metadata.PathDistribution(Path(path))
+        if dist.name is not None:
+            packages.setdefault(dist.name, dist.version)
+    return tuple(packages.items())
+
+
 def get_installed_openwisp_packages():
-    dists = importlib.metadata.distributions()
-    return {
-        dist.name: dist.version
-        for dist in dists
-        if dist.name is not None
-        and (dist.name.startswith("openwisp") or dist.name in EXTRA_OPENWISP_PACKAGES)
-    }
+    """Returns a dict of the installed OpenWISP packages and their version.
+
+    The result is computed once per process, call
+    ``clear_system_info_cache`` to compute it again.
+    """
+    return dict(_get_installed_openwisp_packages())
+
+
+def clear_system_info_cache():
+    _find_openwisp_distributions.cache_clear()
+    _get_installed_openwisp_packages.cache_clear()
+    _get_enabled_openwisp_modules.cache_clear()
+    _get_os_details.cache_clear()
 
 
 def _get_openwisp2_detail(attribute_name, fallback=None):
@@ -35,34 +102,41 @@ def get_openwisp_installation_method():
 
 
 def get_enabled_openwisp_modules():
+    return OrderedDict(_get_enabled_openwisp_modules(tuple(settings.INSTALLED_APPS)))
+
+
+@lru_cache(maxsize=None)
+def _get_enabled_openwisp_modules(installed_apps):
+    # contains the installed apps and all their parent
+    # packages, e.g.: "openwisp_utils.admin_theme" and "openwisp_utils"
+    app_packages = set()
+    for app in installed_apps:
+        parts = app.split(".")
+        app_packages.update(".".join(parts[:i]) for i in range(1, len(parts) + 1))
     enabled_packages = {}
-    installed_packages = get_installed_openwisp_packages()
     extra_packages = {}
-    for package, version in installed_packages.items():
+    for package, version in _get_installed_openwisp_packages():
         if package in EXTRA_OPENWISP_PACKAGES:
             extra_packages[package] = version
-            continue
-        package_name = package.replace("-", "_")
-        if package_name in settings.INSTALLED_APPS:
+        elif package.replace("-", "_") in app_packages:
             enabled_packages[package] = version
-        else:
-            # check for sub-apps
-            for app in settings.INSTALLED_APPS:
-                if app.startswith(package_name + "."):
-                    enabled_packages[package] = version
-                    break
-    enabled_packages = OrderedDict(sorted(enabled_packages.items()))
-    enabled_packages.update(OrderedDict(sorted(extra_packages.items())))
-    return enabled_packages
+    return tuple(sorted(enabled_packages.items())) + tuple(
+        sorted(extra_packages.items())
+    )
 
 
 def get_os_details():
+    return dict(_get_os_details())
+
+
+@lru_cache(maxsize=None)
+def _get_os_details():
     uname = platform.uname()
     os_name = distro.name(pretty=True)
     # Simplify kernel version (e.g., "5.15.0-164-generic" -> "5.15.0")
     kernel_version = uname.release.split("-")[0]
-    return {
-        "os_version": os_name,
-        "kernel_version": kernel_version,
-        "hardware_platform": uname.machine,
-    }
+    return (
+        ("os_version", os_name),
+        ("kernel_version", kernel_version),
+        ("hardware_platform", uname.machine),
+    )
@@ -0,0 +1,54 @@
+import logging
+from smtplib import SMTPException
+
+from celery import shared_task
+
+from ..tasks import OpenwispCeleryTask
+from . import dashboard, email
+from .counters import ALL_ORGANIZATIONS, update_chart_counters
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(base=OpenwispCeleryTask)
+def update_dashboard_chart_counters(position=None, organization_id=ALL_ORGANIZATIONS):
+    """Updates the counters of materialized dashboard charts.
+
+    If ``position`` is ``None``, the counters of all the materialized
+    charts are updated, which can be used to schedule a periodic full
+    re-computation of the counters. ``organization_id=None`` updates
+    only the counters of the objects which do not have an organization.
+    """
+    charts = dashboard.DASHBOARD_CHARTS
+    if position is None:
+        charts = [chart for chart in charts.values() if chart.materialized]
+    elif position in charts:
+        charts = [charts[position]]
+    else:
+        return
+    for chart in charts:
+        update_chart_counters(chart, organization_id)
+
+
+@shared_task(base=OpenwispCeleryTask, bind=True, max_retries=5)
+def send_queued_email(self, *args, **kwargs):
+    """Sends an email queued by ``send_email``.
+
+    Accepts the same arguments of ``send_email``. Transient SMTP errors
+    are retried with an exponential back-off, messages exceeding
+    ``OPENWISP_EMAIL_RATE_LIMIT`` are delayed.
+    """
+    delay = email.get_rate_limit_delay()
+    if delay:
+        # the message is queued again instead of being retried, so that
+        # delays do not count towards max_retries and the back-off
+        self.apply_async(args, kwargs, countdown=delay, retries=self.request.retries)
+        return
+    mail = email._get_email(*args, **kwargs)
+    try:
+        mail.send()
+    except (SMTPException, OSError) as err:
+        if not email.is_transient_smtp_error(err):
+            logger.warning(f"Failed to send email to {mail.to}: {err}")
+            return
+        raise self.retry(exc=err, countdown=30 * 2**self.request.retries)
@@ -1,16 +1,33 @@
 import logging
+from functools import lru_cache
 
 from django import template
+from django.core.signals import setting_changed
 from django.template.defaultfilters import stringfilter
 from django.template.loader import get_template
+from django.utils.autoreload import file_changed
 from django.utils.safestring import mark_safe
 
 logger = logging.getLogger(__name__)
 register = template.Library()
 
 
+@lru_cache(maxsize=None)
+def _get_filter_template(template_name):
+    return get_template(template_name)
+
+
+def _clear_filter_templates(**kwargs):
+    _get_filter_template.cache_clear()
+
+
+# templates are loaded again when they are changed in development
+setting_changed.connect(_clear_filter_templates)
+file_changed.connect(_clear_filter_templates)
+
+
 def _render_single_filter(cl, spec, total_filters, has_sub_filters=False):
-    tpl = get_template(spec.template)
+    tpl = _get_filter_template(spec.template)
     choices = list(spec.choices(cl))
     selected_choice = None
     for choice in choices:
@@ -52,21 +69,22 @@ def ow_render_filters(cl, filter_specs):
     # Sub-filters should not count toward total_filters since they are
     # normally hidden and don't affect the layout decision for the Apply button
     total_filters = len(parent_filters)
-    # Discover relationships
+    # Discover relationships: index the parents by the parameter names they
+    # expect and by their prefixes, e.g.: "shelf__books_type__exact" is
+    # indexed also as "shelf" and "shelf__books_type"
+    parent_index = {}
+    for parent in parent_filters:
+        for param in parent.expected_parameters():
+            parts = param.split("__")
+            for i in range(1, len(parts) + 1):
+                parent_index.setdefault("__".join(parts[:i]), parent)
     parent_to_children = {parent: [] for parent in parent_filters}
     consumed_sub_filters = set()
-    for parent in parent_filters:
-        expected_params = parent.expected_parameters()
-        for child in sub_filters:
-            if child in consumed_sub_filters:
-                continue
-            parent_param = getattr(child, "parent_parameter_name")
-            if any(
-                p == parent_param or p.startswith(parent_param + "__")
-                for p in expected_params
-            ):
-                parent_to_children[parent].append(child)
-                consumed_sub_filters.add(child)
+    for child in sub_filters:
+        parent = parent_index.get(child.parent_parameter_name)
+        if parent is not None:
+            parent_to_children[parent].append(child)
+            consumed_sub_filters.add(child)
     # Handle orphaned sub-filters (those that could not be matched with any parent)
     for child in sub_filters:
         if child not in consumed_sub_filters:
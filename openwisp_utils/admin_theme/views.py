@@ -1,6 +1,47 @@
+from hashlib import md5
+from uuid import uuid4
+
 from admin_auto_filters.views import AutocompleteJsonView as BaseAutocompleteJsonView
-from django.core.exceptions import PermissionDenied
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db.models.signals import post_delete, post_save
 from django.http import JsonResponse
+from django.utils.translation import get_language
+
+from . import settings as app_settings
+
+_CACHE_VERSION_KEY = "ow-autocomplete-version-{}"
+
+
+def _get_cache_version(model):
+    key = _CACHE_VERSION_KEY.format(model._meta.label_lower)
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        cache.set(key, version, timeout=None)
+    return version
+
+
+def invalidate_autocomplete_cache(model):
+    """Invalidates the cached autocomplete results of ``model``."""
+    key = _CACHE_VERSION_KEY.format(model._meta.label_lower)
+    cache.set(key, uuid4().hex, timeout=None)
+
+
+def _model_changed(sender, **kwargs):
+    if not app_settings.AUTOCOMPLETE_FILTER_CACHE_TIMEOUT:
+        return
+    # only models which have search fields can
+    # be shown in the autocomplete filters
+    model_admin = admin.site._registry.get(sender)
+    if model_admin and model_admin.search_fields:
+        invalidate_autocomplete_cache(sender)
+
+
+def connect_autocomplete_cache_signals():
+    post_save.connect(_model_changed, dispatch_uid="ow_autocomplete_model_saved")
+    post_delete.connect(_model_changed, dispatch_uid="ow_autocomplete_model_deleted")
 
 
 class AutocompleteJsonView(BaseAutocompleteJsonView):
@@ -12,6 +53,13 @@ class AutocompleteJsonView(BaseAutocompleteJsonView):
     def get_allow_null(self):
         return True
 
+    def get_keyset_pagination(self):
+        return app_settings.AUTOCOMPLETE_FILTER_KEYSET_PAGINATION
+
+    def get_keyset_field(self):
+        """Returns the unique and indexed field used by keyset pagination."""
+        return "pk"
+
     def get(self, request, *args, **kwargs):
         (
             self.term,
@@ -23,9 +71,45 @@ class AutocompleteJsonView(BaseAutocompleteJsonView):
         if not self.has_perm(request):
             raise PermissionDenied
 
+        timeout = app_settings.AUTOCOMPLETE_FILTER_CACHE_TIMEOUT
+        if not timeout:
+            return JsonResponse(self.get_response_data(request))
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is None:
+            data = self.get_response_data(request)
+            cache.set(key, data, timeout)
+        return JsonResponse(data)
+
+    def get_cache_key(self, request):
+        """Returns the cache key of the results of ``request``.
+
+        The key contains the user, all the query parameters (model,
+        field, term, page), the language and the version of the model,
+        which is changed when objects of the model are saved or deleted.
+        """
+        params = md5(
+            "&".join(sorted(request.GET.urlencode().split("&"))).encode(),
+            usedforsecurity=False,
+        ).hexdigest()
+        return "ow-autocomplete-{user}-{version}-{language}-{params}".format(
+            user=request.user.pk,
+            version=_get_cache_version(self.model_admin.model),
+            language=get_language(),
+            params=params,
+        )
+
+    def get_response_data(self, request):
         self.support_reverse_relation()
         self.object_list = self.get_queryset()
-        context = self.get_context_data()
+        after = request.GET.get("after")
+        if self.get_keyset_pagination():
+            object_list, pagination = self.get_keyset_page(after)
+        else:
+            after = None
+            context = self.get_context_data()
+            object_list = context["object_list"]
+            pagination = {"more": context["page_obj"].has_next()}
         # Add option for filtering objects with None field.
         results = []
         empty_label = self.get_empty_label()
@@ -34,6 +118,7 @@ class AutocompleteJsonView(BaseAutocompleteJsonView):
             and self.get_allow_null()
             and not getattr(self.source_field, "_get_limit_choices_to_mocked", False)
             and not self.term
+            and not after
             or self.term == empty_label
         ):
             # The select2 library requires data in a specific format
@@ -42,15 +127,41 @@ class AutocompleteJsonView(BaseAutocompleteJsonView):
             # Therefore, "null" is used here for "id".
             results += [{"id": "null", "text": empty_label}]
         results += [
-            {"id": str(obj.pk), "text": self.display_text(obj)}
-            for obj in context["object_list"]
+            {"id": str(obj.pk), "text": self.display_text(obj)} for obj in object_list
         ]
-        return JsonResponse(
-            {
-                "results": results,
-                "pagination": {"more": context["page_obj"].has_next()},
-            }
-        )
+        return {"results": results, "pagination": pagination}
+
+    def get_keyset_page(self, after=None):
+        """Returns the objects following ``after`` and the pagination data.
+
+        Objects are ordered by the field returned by ``get_keyset_field``,
+        an additional object is fetched to find out whether there are more
+        results instead of counting them. The ``after`` value of the next
+        page is returned in the pagination data.
+
+        If the ``ModelAdmin`` defines ``autocomplete_display_fields``,
+        only those fields are loaded from the database.
+        """
+        field = self.get_keyset_field()
+        queryset = self.object_list.order_by(field)
+        only_fields = getattr(self.model_admin, "autocomplete_display_fields", None)
+        if only_fields:
+            queryset = queryset.only(field, *only_fields)
+        if after:
+            try:
+                queryset = queryset.filter(**{f"{field}__gt": after})
+            except (ValidationError, ValueError):
+                queryset = queryset.none()
+        limit = self.get_paginate_by(queryset)
+        object_list = list(queryset[: limit + 1])
+        pagination = {"more": len(object_list) > limit}
+        object_list = object_list[:limit]
+        if pagination["more"]:
+            last = object_list[-1]
+            pagination["after"] = str(
+                last.pk if field == "pk" else getattr(last, field)
+            )
+        return object_list, pagination
 
     def support_reverse_relation(self):
         if not hasattr(self.source_field, "get_limit_choices_to"):
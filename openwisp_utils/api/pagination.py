@@ -1,9 +1,14 @@
 from django.core.exceptions import ImproperlyConfigured
+from django.core.paginator import EmptyPage, Page
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
 
 from .. import settings as app_settings
 
 try:
-    from rest_framework.pagination import PageNumberPagination
+    from rest_framework.pagination import CursorPagination, PageNumberPagination
 except ImportError:  # pragma: nocover
     raise ImproperlyConfigured(
         "Django REST Framework is required to use "
@@ -11,17 +16,129 @@ except ImportError:  # pragma: nocover
     )
 
 
+def estimate_count(queryset):
+    """Returns the number of rows of ``queryset`` estimated by PostgreSQL.
+
+    Only unfiltered querysets are estimated, using the statistics of the
+    table (``reltuples``): the estimates of the query planner for filtered
+    querysets can be wrong by orders of magnitude. Returns ``None`` if an
+    estimate is not available (e.g. filtered querysets, other databases).
+    """
+    connection = connections[queryset.db]
+    query = queryset.query
+    if (
+        connection.vendor != "postgresql"
+        or query.where
+        or query.distinct
+        or query.combinator
+        or query.group_by is not None
+        or query.low_mark
+        or query.high_mark is not None
+    ):
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+            [connection.ops.quote_name(queryset.model._meta.db_table)],
+        )
+        row = cursor.fetchone()
+    # tables which have never been analyzed and
+    # partitioned tables do not have statistics
+    if row and row[0] > 0:
+        return int(row[0])
+    return None
+
+
+class EstimatedCountPage(Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class EstimatedCountPaginator(DjangoPaginator):
+    """Paginator which uses the count estimated by the database.
+
+    Counts of filtered querysets and counts lower than
+    ``exact_count_threshold`` are computed exactly.
+    Pages are not validated against the (estimated) number of pages, an
+    additional object is fetched to find out whether there is a next
+    page instead.
+    """
+
+    exact_count_threshold = 1000
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < self.exact_count_threshold:
+            return super().count
+        return estimate
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page + 1
+        object_list = list(self.object_list[bottom:top])
+        if not object_list and number > 1:
+            raise EmptyPage(_("That page contains no results"))
+        return EstimatedCountPage(
+            object_list[: self.per_page],
+            number,
+            self,
+            has_next=len(object_list) > self.per_page,
+        )
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # the upper bound is not checked, the
+            # number of pages may be higher than estimated
+            if int(number) < 1:
+                raise
+            return int(number)
+
+
 class OpenWispPagination(PageNumberPagination):
     """Reusable pagination class with settings-backed defaults."""
 
     page_size = app_settings.API_DEFAULT_PAGE_SIZE
     max_page_size = app_settings.API_MAX_PAGE_SIZE
     page_size_query_param = "page_size"
+    estimated_count = False
 
     def paginate_queryset(self, queryset, request, view=None):
         original_page_size = self.page_size
+        original_paginator_class = self.django_paginator_class
         self.page_size = getattr(view, "pagination_page_size", self.page_size)
+        if getattr(view, "pagination_estimated_count", self.estimated_count):
+            self.django_paginator_class = EstimatedCountPaginator
         try:
             return super().paginate_queryset(queryset, request, view=view)
         finally:
             self.page_size = original_page_size
+            self.django_paginator_class = original_paginator_class
+
+
+class OpenWispCursorPagination(CursorPagination):
+    """Cursor based pagination class with settings-backed defaults.
+
+    The position of the page is encoded in the cursor instead of being
+    an offset, hence fetching deep pages is not slower than fetching the
+    first one. The default ordering fits the ``created`` and ``id``
+    fields of ``TimeStampedEditableModel``.
+    """
+
+    page_size = app_settings.API_DEFAULT_PAGE_SIZE
+    max_page_size = app_settings.API_MAX_PAGE_SIZE
+    page_size_query_param = "page_size"
+    ordering = ("-created", "-id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # CursorPagination stores the page size of the request in
+        # self.page_size, which is needed later to build the links
+        self.page_size = getattr(view, "pagination_page_size", type(self).page_size)
+        return super().paginate_queryset(queryset, request, view=view)
@@ -1,6 +1,6 @@
 from django.apps import AppConfig
 from django.conf import settings
-from django.db.models.signals import post_migrate, pre_save
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
 
 
 class MetricsCollectionConfig(AppConfig):
@@ -21,6 +21,16 @@ class MetricsCollectionConfig(AppConfig):
             sender=Consent,
             dispatch_uid=".Consent.update_consent_withdrawal",
         )
+        post_save.connect(
+            Consent.invalidate_cache,
+            sender=Consent,
+            dispatch_uid=".Consent.invalidate_cache",
+        )
+        post_delete.connect(
+            Consent.invalidate_cache,
+            sender=Consent,
+            dispatch_uid=".Consent.invalidate_cache",
+        )
 
     def connect_post_migrate_signal(self):
         """DEPRECATED: Use `connect_signals` instead.
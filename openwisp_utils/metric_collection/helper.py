@@ -1,7 +1,12 @@
+import hashlib
+import json
 import logging
+from datetime import timedelta
 
 from django.conf import settings
 from django.contrib import messages
+from django.db import transaction
+from django.db.models import Q
 from django.urls import reverse
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
@@ -9,9 +14,22 @@ from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
 from ..utils import retryable_request
+from . import settings as app_settings
 
 logger = logging.getLogger(__name__)
 COLLECTOR_URL = "https://analytics.openwisp.io/cleaninsights.php"
+# claims of interrupted flushes expire after this time
+SPOOL_CLAIM_TIMEOUT = timedelta(hours=1)
+
+
+def get_module_version_fingerprint(module_version):
+    """Returns a hash of a module:version map which does not depend on the order of the keys."""
+    normalized = json.dumps(
+        {str(module): str(version) for module, version in module_version.items()},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(normalized.encode()).hexdigest()
 
 
 class MetricCollectionAdminSiteHelper:
@@ -64,6 +82,7 @@ class MetricCollectionAdminSiteHelper:
             # Update the field in DB after showing the message for the
             # first time.
             consent._meta.model.objects.update(shown_once=True)
+            consent.invalidate_cache()
 
     @classmethod
     def manage_form(cls, request, context):
@@ -77,7 +96,9 @@ class MetricCollectionAdminSiteHelper:
         if request.POST:
             form = ConsentForm(request.POST, instance=consent)
             form.full_clean()
-            form.save()
+            # the cached consent may be stale, hence only
+            # the field of the form is written to the database
+            form.save(commit=False).save(update_fields=["user_consented"])
         else:
             form = ConsentForm(instance=consent)
 
@@ -95,18 +116,14 @@ class MetricCollectionAdminSiteHelper:
 
         from .models import Consent
 
-        consent = Consent.objects.first()
-        if not consent:
-            consent = Consent.objects.create()
-        return consent
+        return Consent.get_consent()
 
 
-def post_metrics(events, collector_url=COLLECTOR_URL):
-    """Post metrics events to the Clean Insights collector.
+def _post_events(events, collector_url, **kwargs):
+    """Posts events to the collector.
 
-    Args:
-        events: List of event dictionaries to send collector_url: URL of
-        the Clean Insights collector
+    Returns the HTTP status code of the response (``204`` on success),
+    ``None`` if no response has been received.
     """
     try:
         response = retryable_request(
@@ -116,17 +133,126 @@ def post_metrics(events, collector_url=COLLECTOR_URL):
                 "idsite": 5,
                 "events": events,
             },
-            max_retries=10,
+            **kwargs,
         )
-        assert response.status_code == 204
     except Exception as error:
-        if isinstance(error, AssertionError):
-            message = f"HTTP {response.status_code} Response"
-        else:
-            message = str(error)
+        message = str(error)
+        status_code = None
+    else:
+        message = f"HTTP {response.status_code} Response"
+        status_code = response.status_code
+    if status_code != 204:
         logger.error(
             f"Collection of usage metrics failed, max retries exceeded. Error: {message}"
         )
+    return status_code
+
+
+def _is_rejected(status_code):
+    """Returns ``True`` if posting the same events again cannot succeed."""
+    return (
+        status_code is not None
+        and 400 <= status_code < 500
+        and status_code not in (408, 429)
+    )
+
+
+def post_metrics(events, collector_url=COLLECTOR_URL):
+    """Post metrics events to the Clean Insights collector.
+
+    If ``OPENWISP_METRIC_COLLECTION_SPOOL`` is enabled, the events are
+    stored in the spool and posted later by ``flush_metrics``.
+
+    Args:
+        events: List of event dictionaries to send collector_url: URL of
+        the Clean Insights collector
+    """
+    if app_settings.SPOOL:
+        spool_metrics(events)
+        return
+    _post_events(events, collector_url, max_retries=10)
+
+
+def spool_metrics(events):
+    """Stores events in the spool, to be posted by ``flush_metrics``."""
+    from .models import SpooledMetric
+
+    SpooledMetric.objects.create(events=events)
+
+
+def _claim_spooled_metrics(batch_size):
+    """Marks up to ``batch_size`` spooled entries as being posted.
+
+    Entries claimed by other flushes are skipped, unless the claim is
+    older than ``SPOOL_CLAIM_TIMEOUT`` (e.g. the flush was interrupted).
+    """
+    from .models import SpooledMetric
+
+    claimed = now()
+    with transaction.atomic():
+        batch = list(
+            SpooledMetric.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(claimed__isnull=True) | Q(claimed__lt=claimed - SPOOL_CLAIM_TIMEOUT)
+            )
+            .order_by("created")
+            .only("id", "events")[:batch_size]
+        )
+        SpooledMetric.objects.filter(pk__in=[entry.pk for entry in batch]).update(
+            claimed=claimed
+        )
+    return batch
+
+
+def flush_metrics(collector_url=COLLECTOR_URL, batch_size=None):
+    """Posts the spooled events to the collector in batches.
+
+    Each batch contains the events of up to ``batch_size`` spooled entries
+    (``OPENWISP_METRIC_COLLECTION_SPOOL_BATCH_SIZE`` by default). The
+    entries are claimed in a short transaction before being posted, and
+    are deleted after the collector has accepted or rejected them (e.g.
+    HTTP 400). The flush is interrupted at the first transient failure
+    (without retrying, the next flush will retry), the remaining entries
+    are kept in the spool.
+
+    If the user has withdrawn the consent, only the consent withdrawal
+    events are posted, the other events are discarded.
+
+    Returns the number of events which have been posted.
+    """
+    from .models import Consent, SpooledMetric
+
+    batch_size = batch_size or app_settings.SPOOL_BATCH_SIZE
+    consented = not Consent.objects.filter(user_consented=False).exists()
+    posted = 0
+    while True:
+        batch = _claim_spooled_metrics(batch_size)
+        if not batch:
+            break
+        entries = SpooledMetric.objects.filter(pk__in=[entry.pk for entry in batch])
+        events = [
+            event
+            for entry in batch
+            for event in entry.events
+            if consented or event.get("category") == "Consent Withdrawn"
+        ]
+        status_code = 204
+        if events:
+            status_code = _post_events(events, collector_url, max_retries=0)
+        if status_code != 204 and not _is_rejected(status_code):
+            entries.update(claimed=None)
+            break
+        entries.delete()
+        if status_code != 204:
+            logger.error(
+                f"Spooled metrics rejected by the collector, discarded "
+                f"events={len(events)}"
+            )
+            continue
+        posted += len(events)
+        if events:
+            logger.info(f"Spooled metrics sent successfully, events={len(events)}")
+    return posted
 
 
 def get_events(category, data):
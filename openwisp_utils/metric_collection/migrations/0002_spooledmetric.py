@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:16
+
+import django.utils.timezone
+import model_utils.fields
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("metric_collection", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SpooledMetric",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="created",
+                    ),
+                ),
+                ("events", models.JSONField(default=list)),
+            ],
+            options={
+                "ordering": ("created",),
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:22
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+def get_module_version_fingerprint(module_version):
+    # copy of metric_collection.helper.get_module_version_fingerprint
+    # at the time of this migration
+    normalized = json.dumps(
+        {str(module): str(version) for module, version in module_version.items()},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def set_fingerprint(apps, schema_editor):
+    OpenwispVersion = apps.get_model("metric_collection", "OpenwispVersion")
+    for version in OpenwispVersion.objects.only("module_version").iterator():
+        version.fingerprint = get_module_version_fingerprint(
+            version.module_version or {}
+        )
+        version.save(update_fields=["fingerprint"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("metric_collection", "0002_spooledmetric"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="openwispversion",
+            name="fingerprint",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(set_fingerprint, reverse_code=migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="openwispversion",
+            index=models.Index(
+                fields=["-created", "fingerprint"], name="openwispversion_history_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("metric_collection", "0003_openwispversion_fingerprint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="spooledmetric",
+            name="claimed",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,6 +1,7 @@
 import logging
 
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from packaging.version import parse as parse_version
 
@@ -11,7 +12,13 @@ from ..admin_theme.system_info import (
     get_os_details,
 )
 from ..base import TimeStampedEditableModel
-from .helper import COLLECTOR_URL, get_events, post_metrics
+from . import settings as app_settings
+from .helper import (
+    COLLECTOR_URL,
+    get_events,
+    get_module_version_fingerprint,
+    post_metrics,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +26,9 @@ logger = logging.getLogger(__name__)
 class OpenwispVersion(TimeStampedEditableModel):
     modified = None
     module_version = models.JSONField(default=dict, blank=True)
+    # hash of module_version, allows detecting changes without
+    # loading and parsing the versions stored in module_version
+    fingerprint = models.CharField(max_length=64, blank=True, editable=False)
 
     # DEPRECATED: Use COLLECTOR_URL from helper module instead.
     # TODO: Remove this in the next major release.
@@ -26,6 +36,18 @@ class OpenwispVersion(TimeStampedEditableModel):
 
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            # allows reading the fingerprint of the
+            # latest entry without accessing the table
+            models.Index(
+                fields=["-created", "fingerprint"],
+                name="openwispversion_history_idx",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.fingerprint = get_module_version_fingerprint(self.module_version)
+        return super().save(*args, **kwargs)
 
     @classmethod
     def log_module_version_changes(cls, current_versions):
@@ -37,19 +59,27 @@ class OpenwispVersion(TimeStampedEditableModel):
         - whether any OpenWISP modules has been upgraded.
 
         If no module has been upgraded, it won't store anything in the DB.
+        When the versions did not change since the last check, a single
+        query is executed.
         """
-        openwisp_version = cls.objects.first()
-        if not openwisp_version:
+        latest = cls.objects.values_list("pk", "fingerprint").first()
+        if not latest:
             # If no OpenwispVersion object is present,
             # it means that this is a new installation and
             # we don't need to check for upgraded modules.
             cls.objects.create(module_version=current_versions)
             return True, False
+        pk, fingerprint = latest
+        if fingerprint == get_module_version_fingerprint(current_versions):
+            return False, False
         # Check which installed modules have been upgraded by comparing
         # the currently installed versions in current_versions with the
         # versions stored in the OpenwispVersion object. The return value
         # is a dictionary of module:version pairs that have been upgraded.
-        old_versions = openwisp_version.module_version
+        old_versions = (
+            cls.objects.filter(pk=pk).values_list("module_version", flat=True).first()
+            or {}
+        )
         upgraded_modules = {}
         for module, version in current_versions.items():
             # The OS version does not follow semver,
@@ -68,7 +98,6 @@ class OpenwispVersion(TimeStampedEditableModel):
                 )
             ):
                 upgraded_modules[module] = version
-            openwisp_version.module_version[module] = version
         # Log version changes
         if upgraded_modules:
             OpenwispVersion.objects.create(module_version=current_versions)
@@ -151,6 +180,30 @@ class Consent(TimeStampedEditableModel):
         ),
     )
 
+    _CACHE_KEY = "ow-metric-collection-consent"
+
+    @classmethod
+    def get_consent(cls):
+        """Returns the Consent object, creating it if it does not exist.
+
+        The object is cached until it is saved or deleted, or for
+        ``OPENWISP_METRIC_COLLECTION_CONSENT_CACHE_TIMEOUT`` seconds,
+        since other processes may not share the same cache.
+        """
+        consent = cache.get(cls._CACHE_KEY)
+        if consent is None:
+            consent = cls.objects.first()
+            if not consent:
+                consent = cls.objects.create()
+            cache.set(
+                cls._CACHE_KEY, consent, timeout=app_settings.CONSENT_CACHE_TIMEOUT
+            )
+        return consent
+
+    @classmethod
+    def invalidate_cache(cls, **kwargs):
+        cache.delete(cls._CACHE_KEY)
+
     @classmethod
     def update_consent_withdrawal(cls, sender, instance, **kwargs):
         """Collects metric when a user withdraws consent for metric collection.
@@ -158,6 +211,9 @@ class Consent(TimeStampedEditableModel):
         This signal handler sends a 'Consent Withdrawn' event when a user
         changes user_consented from True to False, providing the last data
         point before communications are interrupted.
+
+        The event is sent by a celery task after the transaction is
+        committed, hence saving the consent never waits for the collector.
         """
         if instance._state.adding or instance.user_consented is True:
             # This is a new instance or the user has not opted out,
@@ -165,16 +221,35 @@ class Consent(TimeStampedEditableModel):
 
         try:
             db_instance = sender.objects.get(pk=instance.pk)
-            # Check if consent was withdrawn (changed from True to False)
-            if (
-                instance.user_consented is False
-                and db_instance.user_consented != instance.user_consented
-            ):
-                logger.info("Consent withdrawn, sending final metric event")
-                # Create a simple event for consent withdrawal
-                events = get_events("Consent Withdrawn", {"Action": "Opt-out"})
-                post_metrics(events)
-                logger.info("Consent withdrawal metric sent successfully")
         except sender.DoesNotExist:
             # In case the instance doesn't exist in DB yet, just pass
-            pass
+            return
+        # Check if consent was withdrawn (changed from True to False)
+        if db_instance.user_consented != instance.user_consented:
+            from .tasks import send_consent_withdrawal_metrics
+
+            transaction.on_commit(send_consent_withdrawal_metrics.delay)
+
+    @classmethod
+    def send_consent_withdrawal_metrics(cls):
+        logger.info("Consent withdrawn, sending final metric event")
+        # Create a simple event for consent withdrawal
+        events = get_events("Consent Withdrawn", {"Action": "Opt-out"})
+        post_metrics(events)
+        logger.info("Consent withdrawal metric sent successfully")
+
+
+class SpooledMetric(TimeStampedEditableModel):
+    """Usage metric events waiting to be posted to the collector.
+
+    Used when ``OPENWISP_METRIC_COLLECTION_SPOOL`` is enabled, the events
+    are posted in batches by the ``flush_usage_metrics`` celery task.
+    """
+
+    modified = None
+    events = models.JSONField(default=list)
+    # set while the entry is being posted by flush_metrics
+    claimed = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        ordering = ("created",)
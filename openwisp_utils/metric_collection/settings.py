@@ -0,0 +1,7 @@
+from django.conf import settings
+
+SPOOL = getattr(settings, "OPENWISP_METRIC_COLLECTION_SPOOL", False)
+SPOOL_BATCH_SIZE = getattr(settings, "OPENWISP_METRIC_COLLECTION_SPOOL_BATCH_SIZE", 100)
+CONSENT_CACHE_TIMEOUT = getattr(
+    settings, "OPENWISP_METRIC_COLLECTION_CONSENT_CACHE_TIMEOUT", 300
+)
@@ -1,9 +1,20 @@
 from celery import shared_task
 
 from ..tasks import OpenwispCeleryTask
-from .models import OpenwispVersion
+from .helper import flush_metrics
+from .models import Consent, OpenwispVersion
 
 
 @shared_task(base=OpenwispCeleryTask)
 def send_usage_metrics(category="Heartbeat"):
     OpenwispVersion.send_usage_metrics(category)
+
+
+@shared_task(base=OpenwispCeleryTask)
+def send_consent_withdrawal_metrics():
+    Consent.send_consent_withdrawal_metrics()
+
+
+@shared_task(base=OpenwispCeleryTask)
+def flush_usage_metrics():
+    flush_metrics()
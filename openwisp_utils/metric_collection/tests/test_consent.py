@@ -1,10 +1,14 @@
 from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase, modify_settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from freezegun import freeze_time
 
+from .. import settings as app_settings
 from ..models import Consent
 from . import _CONSENT_WITHDRAWN_METRICS
 
@@ -97,6 +101,77 @@ class TestConsent(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertNotContains(response, "messagelist")
 
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_consent_cache(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        superuser = self._get_user(is_staff=True, is_superuser=True)
+        self.client.force_login(superuser)
+        path = reverse("admin:index")
+        consent_table = Consent._meta.db_table
+
+        def _get_consent_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            return [q for q in context.captured_queries if consent_table in q["sql"]]
+
+        with self.subTest("Consent is created and shown once"):
+            self.assertNotEqual(_get_consent_queries(), [])
+            self.assertEqual(Consent.objects.get().shown_once, True)
+
+        with self.subTest("Cached consent is used"):
+            # the cache is populated again after "shown_once" has been set
+            _get_consent_queries()
+            self.assertEqual(_get_consent_queries(), [])
+            self.assertEqual(Consent.get_consent().shown_once, True)
+
+        with self.subTest("Cache is invalidated on save"):
+            consent = Consent.objects.get()
+            consent.user_consented = False
+            consent.save()
+            self.assertEqual(Consent.get_consent().user_consented, False)
+
+        with self.subTest("Cache is invalidated on delete"):
+            consent.delete()
+            consent = Consent.get_consent()
+            self.assertEqual(consent.user_consented, True)
+            self.assertEqual(consent.shown_once, False)
+            self.assertEqual(Consent.objects.count(), 1)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_stale_consent_cache(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        superuser = self._get_user(is_staff=True, is_superuser=True)
+        self.client.force_login(superuser)
+
+        with self.subTest("Consent is cached with a finite timeout"):
+            with patch.object(cache, "set", wraps=cache.set) as mocked_set:
+                Consent.get_consent()
+            mocked_set.assert_called_once()
+            self.assertEqual(
+                mocked_set.call_args.kwargs["timeout"],
+                app_settings.CONSENT_CACHE_TIMEOUT,
+            )
+
+        with self.subTest("Stale cached consent does not overwrite other fields"):
+            # emulates a change made by another process
+            # which does not share the same cache
+            Consent.objects.update(shown_once=True)
+            self.assertEqual(Consent.get_consent().shown_once, False)
+            response = self.client.post(
+                reverse("admin:ow-info"), {"user_consented": False}
+            )
+            self.assertEqual(response.status_code, 200)
+            consent = Consent.objects.get()
+            self.assertEqual(consent.user_consented, False)
+            self.assertEqual(consent.shown_once, True)
+
     def test_consent_change(self):
         non_superuser = self._get_user(is_staff=True, is_superuser=False)
         superuser = self._get_user(
@@ -158,23 +233,33 @@ class TestConsent(TestCase):
         """Test that metrics for consent withdrawal are sent."""
 
         with self.subTest("New consent object does not trigger metric"):
-            consent = Consent.objects.create(user_consented=False)
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                consent = Consent.objects.create(user_consented=False)
+            self.assertEqual(len(callbacks), 0)
             mock_post_metrics.assert_not_called()
 
         with self.subTest("No change in consent does not trigger metric"):
-            consent.save()
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                consent.save()
+            self.assertEqual(len(callbacks), 0)
             mock_post_metrics.assert_not_called()
 
         with self.subTest("Consent opt-in does not trigger metric"):
             consent.user_consented = True
             consent.full_clean()
-            consent.save()
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                consent.save()
+            self.assertEqual(len(callbacks), 0)
             mock_post_metrics.assert_not_called()
 
         with self.subTest("Test consent withdrawal triggers metric"):
             consent.user_consented = False
             consent.full_clean()
-            consent.save()
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                consent.save()
+                # the metric is sent only after the transaction is committed
+                mock_post_metrics.assert_not_called()
+            self.assertEqual(len(callbacks), 1)
             mock_post_metrics.assert_called_once_with(_CONSENT_WITHDRAWN_METRICS)
 
         Consent.objects.update(user_consented=True)
@@ -183,5 +268,24 @@ class TestConsent(TestCase):
             with patch.object(Consent.objects, "get", side_effect=Consent.DoesNotExist):
                 consent.user_consented = False
                 consent.full_clean()
-                consent.save()
+                with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                    consent.save()
+                self.assertEqual(len(callbacks), 0)
                 mock_post_metrics.assert_not_called()
+
+    @patch("openwisp_utils.metric_collection.tasks.send_consent_withdrawal_metrics")
+    def test_consent_withdrawal_form_does_not_block(self, mocked_task):
+        superuser = self._get_user(is_staff=True, is_superuser=True)
+        Consent.objects.create()
+        self.client.force_login(superuser)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with patch(
+                "openwisp_utils.metric_collection.models.post_metrics"
+            ) as mocked_post_metrics:
+                response = self.client.post(
+                    reverse("admin:ow-info"), {"user_consented": False}
+                )
+        self.assertEqual(response.status_code, 200)
+        mocked_post_metrics.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        mocked_task.delay.assert_called_once_with()
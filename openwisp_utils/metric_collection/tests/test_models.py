@@ -1,17 +1,22 @@
-from datetime import datetime, timezone
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch
 
 import requests
 from django.apps import apps
 from django.db import migrations
 from django.test import TestCase, override_settings
+from django.utils.timezone import now
 from freezegun import freeze_time
 from openwisp_utils import utils
 from openwisp_utils.admin_theme import system_info
 from urllib3.response import HTTPResponse
 
 from .. import helper, models, tasks
-from ..models import Consent, OpenwispVersion
+from ..models import Consent, OpenwispVersion, SpooledMetric
 from . import (
     _ENABLED_OPENWISP_MODULES_RETURN_VALUE,
     _HEARTBEAT_METRICS,
@@ -237,6 +242,46 @@ class TestOpenwispVersion(TestCase):
         tasks.send_usage_metrics.delay(category="Upgrade")
         mocked_post.assert_not_called()
 
+    def test_log_module_version_changes_fingerprint(self):
+        versions = {
+            "OpenWISP Version": "23.0.0a",
+            **_ENABLED_OPENWISP_MODULES_RETURN_VALUE,
+            **_OS_DETAILS_RETURN_VALUE,
+        }
+        OpenwispVersion.objects.all().delete()
+        OpenwispVersion.log_module_version_changes(versions)
+        version = OpenwispVersion.objects.get()
+        self.assertEqual(
+            version.fingerprint, helper.get_module_version_fingerprint(versions)
+        )
+        self.assertEqual(
+            version.fingerprint,
+            helper.get_module_version_fingerprint(dict(reversed(versions.items()))),
+        )
+
+        with self.subTest("Unchanged versions are detected with one query"):
+            with patch.object(models, "parse_version") as mocked_parse:
+                with self.assertNumQueries(1):
+                    result = OpenwispVersion.log_module_version_changes(versions)
+            self.assertEqual(result, (False, False))
+            mocked_parse.assert_not_called()
+
+        with self.subTest("Downgrades are not logged"):
+            downgraded = {**versions, "openwisp-utils": "1.0.0"}
+            result = OpenwispVersion.log_module_version_changes(downgraded)
+            self.assertEqual(result, (False, False))
+            self.assertEqual(OpenwispVersion.objects.count(), 1)
+
+        with self.subTest("Upgrades are logged"):
+            upgraded = {**versions, "openwisp-utils": "99.0.0"}
+            result = OpenwispVersion.log_module_version_changes(upgraded)
+            self.assertEqual(result, (False, True))
+            self.assertEqual(OpenwispVersion.objects.count(), 2)
+            self.assertEqual(
+                OpenwispVersion.objects.first().fingerprint,
+                helper.get_module_version_fingerprint(upgraded),
+            )
+
     @patch("time.sleep")
     @patch("logging.Logger.warning")
     @patch("logging.Logger.error")
@@ -369,3 +414,178 @@ class TestOpenwispVersion(TestCase):
         Consent.objects.create(user_consented=False)
         tasks.send_usage_metrics.delay()
         mocked_post_usage_metrics.assert_not_called()
+
+
+class CollectorRequestHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.append(json.loads(body))
+        self.send_response(self.server.status_code)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestMetricsSpool(TestCase):
+    def setUp(self):
+        # local stand-in for the Clean Insights collector
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), CollectorRequestHandler)
+        self.server.received = []
+        self.server.status_code = 204
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.collector_url = f"http://127.0.0.1:{self.server.server_port}/"
+        # Unmock post request from MockedRequestPostRunner
+        patcher = patch.object(
+            utils.requests.Session, "post", new=utils.requests.Session._original_post
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_events(self, number):
+        return helper.get_events("Heartbeat", {f"module-{number}": "1.0"})
+
+    @patch.object(helper.app_settings, "SPOOL", True)
+    @patch.object(helper, "retryable_request")
+    def test_post_metrics_spooled(self, mocked_retryable_request):
+        events = self._get_events(1)
+        helper.post_metrics(events)
+        mocked_retryable_request.assert_not_called()
+        self.assertEqual(SpooledMetric.objects.get().events, events)
+
+    @patch.object(helper.app_settings, "SPOOL", True)
+    def test_send_usage_metrics_spooled(self):
+        tasks.send_usage_metrics.delay()
+        spooled_metric = SpooledMetric.objects.get()
+        self.assertEqual(self.server.received, [])
+        with patch.object(
+            tasks,
+            "flush_metrics",
+            partial(helper.flush_metrics, collector_url=self.collector_url),
+        ):
+            tasks.flush_usage_metrics.delay()
+        self.assertEqual(SpooledMetric.objects.count(), 0)
+        self.assertEqual(len(self.server.received), 1)
+        self.assertEqual(self.server.received[0]["events"], spooled_metric.events)
+
+    def test_flush_metrics_batches(self):
+        for number in range(5):
+            helper.spool_metrics(self._get_events(number))
+        posted = helper.flush_metrics(collector_url=self.collector_url, batch_size=2)
+        self.assertEqual(posted, 5)
+        self.assertEqual(SpooledMetric.objects.count(), 0)
+        self.assertEqual(len(self.server.received), 3)
+        self.assertEqual(
+            [event for data in self.server.received for event in data["events"]],
+            [event for number in range(5) for event in self._get_events(number)],
+        )
+        self.assertEqual(self.server.received[0]["idsite"], 5)
+
+    @patch("logging.Logger.error")
+    def test_flush_metrics_collector_outage(self, mocked_error):
+        for number in range(3):
+            helper.spool_metrics(self._get_events(number))
+        self.server.status_code = 503
+        with patch("urllib3.util.retry.Retry.sleep") as mocked_sleep:
+            posted = helper.flush_metrics(
+                collector_url=self.collector_url, batch_size=2
+            )
+        self.assertEqual(posted, 0)
+        # the flush is interrupted at the first failure without retrying
+        self.assertEqual(len(self.server.received), 1)
+        mocked_sleep.assert_not_called()
+        mocked_error.assert_called_once()
+        self.assertEqual(SpooledMetric.objects.count(), 3)
+
+        with self.subTest("Events are posted when the collector recovers"):
+            self.server.status_code = 204
+            self.server.received.clear()
+            posted = helper.flush_metrics(collector_url=self.collector_url)
+            self.assertEqual(posted, 3)
+            self.assertEqual(len(self.server.received), 1)
+            self.assertEqual(SpooledMetric.objects.count(), 0)
+
+    def test_flush_metrics_empty_spool(self):
+        self.assertEqual(helper.flush_metrics(collector_url=self.collector_url), 0)
+        self.assertEqual(self.server.received, [])
+
+    def test_flush_metrics_consent_withdrawn(self):
+        helper.spool_metrics(self._get_events(1))
+        withdrawal_events = helper.get_events(
+            "Consent Withdrawn", {"Action": "Opt-out"}
+        )
+        helper.spool_metrics(withdrawal_events)
+        Consent.objects.create(user_consented=False)
+        posted = helper.flush_metrics(collector_url=self.collector_url)
+        self.assertEqual(posted, 1)
+        self.assertEqual(len(self.server.received), 1)
+        self.assertEqual(self.server.received[0]["events"], withdrawal_events)
+        self.assertEqual(SpooledMetric.objects.count(), 0)
+
+        with self.subTest("Nothing is posted without withdrawal events"):
+            self.server.received.clear()
+            helper.spool_metrics(self._get_events(2))
+            posted = helper.flush_metrics(collector_url=self.collector_url)
+            self.assertEqual(posted, 0)
+            self.assertEqual(self.server.received, [])
+            self.assertEqual(SpooledMetric.objects.count(), 0)
+
+    @patch("logging.Logger.error")
+    def test_flush_metrics_rejected(self, mocked_error):
+        for number in range(3):
+            helper.spool_metrics(self._get_events(number))
+
+        with self.subTest("Rate limited events are kept"):
+            self.server.status_code = 429
+            posted = helper.flush_metrics(
+                collector_url=self.collector_url, batch_size=2
+            )
+            self.assertEqual(posted, 0)
+            self.assertEqual(len(self.server.received), 1)
+            self.assertEqual(SpooledMetric.objects.filter(claimed=None).count(), 3)
+
+        with self.subTest("Rejected events are discarded"):
+            self.server.status_code = 400
+            self.server.received.clear()
+            mocked_error.reset_mock()
+            posted = helper.flush_metrics(
+                collector_url=self.collector_url, batch_size=2
+            )
+            self.assertEqual(posted, 0)
+            self.assertEqual(len(self.server.received), 2)
+            self.assertEqual(SpooledMetric.objects.count(), 0)
+            # one error for each response and one for each discarded batch
+            self.assertEqual(mocked_error.call_count, 4)
+
+    def test_flush_metrics_claimed(self):
+        for number in range(2):
+            helper.spool_metrics(self._get_events(number))
+        post_events = helper._post_events
+
+        def _post_events(*args, **kwargs):
+            # the entries are claimed while being posted,
+            # hence concurrent flushes do not post them again
+            self.assertEqual(SpooledMetric.objects.filter(claimed=None).count(), 0)
+            self.assertEqual(helper.flush_metrics(collector_url=self.collector_url), 0)
+            return post_events(*args, **kwargs)
+
+        with patch.object(helper, "_post_events", side_effect=_post_events):
+            posted = helper.flush_metrics(collector_url=self.collector_url)
+        self.assertEqual(posted, 2)
+        self.assertEqual(len(self.server.received), 1)
+        self.assertEqual(SpooledMetric.objects.count(), 0)
+
+        with self.subTest("Claims of interrupted flushes expire"):
+            self.server.received.clear()
+            helper.spool_metrics(self._get_events(3))
+            SpooledMetric.objects.update(claimed=now())
+            self.assertEqual(helper.flush_metrics(collector_url=self.collector_url), 0)
+            SpooledMetric.objects.update(
+                claimed=now() - helper.SPOOL_CLAIM_TIMEOUT - timedelta(seconds=1)
+            )
+            self.assertEqual(helper.flush_metrics(collector_url=self.collector_url), 1)
+            self.assertEqual(len(self.server.received), 1)
@@ -17,6 +17,17 @@ API_INFO = getattr(
 CELERY_HARD_TIME_LIMIT = getattr(settings, "OPENWISP_CELERY_HARD_TIME_LIMIT", 120)
 CELERY_SOFT_TIME_LIMIT = getattr(settings, "OPENWISP_CELERY_SOFT_TIME_LIMIT", 30)
 
+ASYNC_REQUESTS_MAX_WORKERS = getattr(
+    settings, "OPENWISP_ASYNC_REQUESTS_MAX_WORKERS", 10
+)
+CIRCUIT_BREAKER_THRESHOLD = getattr(settings, "OPENWISP_CIRCUIT_BREAKER_THRESHOLD", 0)
+CIRCUIT_BREAKER_RECOVERY_TIME = getattr(
+    settings, "OPENWISP_CIRCUIT_BREAKER_RECOVERY_TIME", 60
+)
+CIRCUIT_BREAKER_CACHE = getattr(settings, "OPENWISP_CIRCUIT_BREAKER_CACHE", None)
+RETRY_BUDGET_RATIO = getattr(settings, "OPENWISP_RETRY_BUDGET_RATIO", 0)
+RETRY_BUDGET_MIN_RETRIES = getattr(settings, "OPENWISP_RETRY_BUDGET_MIN_RETRIES", 10)
+
 # Pagination defaults for OpenWispPagination
 API_DEFAULT_PAGE_SIZE = getattr(settings, "OPENWISP_API_DEFAULT_PAGE_SIZE", 10)
 API_MAX_PAGE_SIZE = getattr(settings, "OPENWISP_API_MAX_PAGE_SIZE", 100)
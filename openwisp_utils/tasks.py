@@ -1,8 +1,16 @@
 from celery import Task
+from celery.signals import worker_process_shutdown, worker_shutdown
 
 from . import settings as app_settings
+from .utils import close_retryable_sessions
 
 
 class OpenwispCeleryTask(Task):
     soft_time_limit = app_settings.CELERY_SOFT_TIME_LIMIT
     time_limit = app_settings.CELERY_HARD_TIME_LIMIT
+
+
+# closes the keep-alive connections of retryable_request
+# when celery workers are stopped
+worker_shutdown.connect(close_retryable_sessions, weak=False)
+worker_process_shutdown.connect(close_retryable_sessions, weak=False)
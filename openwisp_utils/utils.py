@@ -1,20 +1,80 @@
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
+from functools import partial
+from http.cookiejar import DefaultCookiePolicy
+from itertools import islice
+from urllib.parse import urlsplit
 
 import requests
 from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
 from django.utils.crypto import get_random_string
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
 
 class SortedOrderedDict(OrderedDict):
-    def update(self, items):
-        super().update(items)
-        temp = deepcopy(self)
-        temp = sorted((temp.items()), key=lambda x: x[0])
-        self.clear()
-        super().update(temp)
+    """Ordered dictionary which keeps its keys sorted.
+
+    The sorted keys are maintained in a list with ``bisect``: inserting
+    a key greater than the existing ones (the most common case when
+    registering menu items and dashboard elements) does not move any
+    other key, values are never copied.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._keys = []
+        super().__init__()
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        if key in self:
+            super().__setitem__(key, value)
+            return
+        index = bisect_left(self._keys, key)
+        self._keys.insert(index, key)
+        super().__setitem__(key, value)
+        # moves the greater keys after the new one
+        for greater_key in islice(self._keys, index + 1, None):
+            self.move_to_end(greater_key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        del self._keys[bisect_left(self._keys, key)]
+
+    def __reduce__(self):
+        return self.__class__, (list(self.items()),)
+
+    def pop(self, key, *args):
+        if key not in self:
+            if args:
+                return args[0]
+            raise KeyError(key)
+        value = self[key]
+        del self[key]
+        return value
+
+    def popitem(self, last=True):
+        if not self:
+            raise KeyError("dictionary is empty")
+        key = self._keys[-1] if last else self._keys[0]
+        return key, self.pop(key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def clear(self):
+        super().clear()
+        self._keys.clear()
 
 
 def get_random_key():
@@ -67,6 +127,228 @@ def print_color(string, color_name, end="\n"):
     print(f"\033[{color}m{string}\033[0m", end=end)
 
 
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised when requests to a host are suspended by the circuit breaker."""
+
+
+# stores the state of circuit breakers and retry budget
+# when OPENWISP_CIRCUIT_BREAKER_CACHE is not set
+_RESILIENCE_LOCAL_CACHE = LocMemCache("openwisp-utils-resilience", {})
+_RETRY_BUDGET_WINDOW = 10
+
+
+def _get_resilience_settings():
+    # retryable_request is used also outside of django projects
+    if not settings.configured:
+        return None
+    from . import settings as app_settings
+
+    return app_settings
+
+
+def _get_resilience_cache(app_settings):
+    if app_settings.CIRCUIT_BREAKER_CACHE:
+        return caches[app_settings.CIRCUIT_BREAKER_CACHE]
+    return _RESILIENCE_LOCAL_CACHE
+
+
+def _cache_incr(cache, key, timeout):
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # the key expired in the meantime
+        cache.add(key, 1, timeout)
+        return 1
+
+
+class _CircuitBreaker:
+    """Per host circuit breaker.
+
+    The circuit is opened after ``CIRCUIT_BREAKER_THRESHOLD`` consecutive
+    failed requests, requests are then refused until
+    ``CIRCUIT_BREAKER_RECOVERY_TIME`` seconds have passed, after which a
+    single trial request is allowed (half-open state): the circuit is
+    closed if it succeeds or opened again if it fails.
+    """
+
+    def __init__(self, url, app_settings):
+        self.host = urlsplit(url).netloc.lower()
+        self.threshold = app_settings.CIRCUIT_BREAKER_THRESHOLD
+        self.recovery_time = app_settings.CIRCUIT_BREAKER_RECOVERY_TIME
+        self.cache = _get_resilience_cache(app_settings)
+        prefix = f"ow-circuit-breaker-{self.host}"
+        self.failures_key = f"{prefix}-failures"
+        self.open_key = f"{prefix}-open"
+        self.trial_key = f"{prefix}-trial"
+
+    def before_request(self):
+        if self.cache.get(self.open_key):
+            raise CircuitOpenError(
+                f"Requests to {self.host} are suspended after repeated failures"
+            )
+        if (self.cache.get(self.failures_key) or 0) < self.threshold:
+            return
+        # half-open: only one request is allowed to probe the host
+        if not self.cache.add(self.trial_key, True, self.recovery_time):
+            raise CircuitOpenError(
+                f"Requests to {self.host} are suspended, waiting for the"
+                " result of a trial request"
+            )
+
+    def release_trial(self):
+        self.cache.delete(self.trial_key)
+
+    def record_success(self):
+        self.cache.delete_many([self.failures_key, self.trial_key])
+
+    def record_failure(self):
+        failures = _cache_incr(self.cache, self.failures_key, None)
+        if failures >= self.threshold:
+            self.cache.set(self.open_key, True, self.recovery_time)
+            self.cache.delete(self.trial_key)
+
+
+def _get_circuit_breaker(url):
+    app_settings = _get_resilience_settings()
+    if not url or app_settings is None or not app_settings.CIRCUIT_BREAKER_THRESHOLD:
+        return None
+    return _CircuitBreaker(url, app_settings)
+
+
+def _get_retry_budget_keys():
+    window = int(time.time() // _RETRY_BUDGET_WINDOW)
+    return (
+        f"ow-retry-budget-requests-{window}",
+        f"ow-retry-budget-retries-{window}",
+    )
+
+
+def _record_retry_budget_request():
+    app_settings = _get_resilience_settings()
+    if app_settings is None or not app_settings.RETRY_BUDGET_RATIO:
+        return
+    cache = _get_resilience_cache(app_settings)
+    requests_key, _ = _get_retry_budget_keys()
+    _cache_incr(cache, requests_key, _RETRY_BUDGET_WINDOW * 2)
+
+
+def _withdraw_retry_budget():
+    """Returns ``False`` if the retry budget is exhausted.
+
+    In each time window, retries are allowed up to
+    ``RETRY_BUDGET_MIN_RETRIES`` plus ``RETRY_BUDGET_RATIO`` times the
+    number of requests.
+    """
+    app_settings = _get_resilience_settings()
+    if app_settings is None or not app_settings.RETRY_BUDGET_RATIO:
+        return True
+    cache = _get_resilience_cache(app_settings)
+    requests_key, retries_key = _get_retry_budget_keys()
+    retries = _cache_incr(cache, retries_key, _RETRY_BUDGET_WINDOW * 2)
+    allowed_retries = (
+        app_settings.RETRY_BUDGET_MIN_RETRIES
+        + app_settings.RETRY_BUDGET_RATIO * (cache.get(requests_key) or 0)
+    )
+    return retries <= allowed_retries
+
+
+class _BudgetedRetry(Retry):
+    """Retry policy which stops retrying when the retry budget is exhausted."""
+
+    def increment(
+        self,
+        method=None,
+        url=None,
+        response=None,
+        error=None,
+        _pool=None,
+        _stacktrace=None,
+    ):
+        is_redirect = response is not None and response.get_redirect_location()
+        if not is_redirect and not _withdraw_retry_budget():
+            # exhausts the retries in order to raise the usual exceptions
+            return Retry.increment(
+                self.new(total=0),
+                method=method,
+                url=url,
+                response=response,
+                error=error,
+                _pool=_pool,
+                _stacktrace=_stacktrace,
+            )
+        return super().increment(
+            method=method,
+            url=url,
+            response=response,
+            error=error,
+            _pool=_pool,
+            _stacktrace=_stacktrace,
+        )
+
+
+# sessions used by retryable_request, keyed by retry and pool policy
+_RETRYABLE_SESSIONS = {}
+_RETRYABLE_SESSIONS_LOCK = threading.Lock()
+# threads used by async_retryable_request
+_ASYNC_REQUESTS_EXECUTOR = None
+
+
+def _get_retryable_session(retry_kwargs, pool_connections, pool_maxsize):
+    """Returns a session shared by the requests using the same policy.
+
+    The session keeps the connections alive in its connection pools,
+    cookies are never stored in order to avoid leaking them across
+    unrelated requests.
+    """
+    key = (repr(sorted(retry_kwargs.items())), pool_connections, pool_maxsize)
+    session = _RETRYABLE_SESSIONS.get(key)
+    if session is not None:
+        return session
+    with _RETRYABLE_SESSIONS_LOCK:
+        if key not in _RETRYABLE_SESSIONS:
+            session = requests.Session()
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            adapter = HTTPAdapter(
+                max_retries=_BudgetedRetry(**retry_kwargs),
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _RETRYABLE_SESSIONS[key] = session
+        return _RETRYABLE_SESSIONS[key]
+
+
+def close_retryable_sessions(**kwargs):
+    """Closes the sessions (and connections) used by retryable_request.
+
+    Accepts arbitrary keyword arguments to be usable as signal receiver.
+    """
+    global _ASYNC_REQUESTS_EXECUTOR
+    with _RETRYABLE_SESSIONS_LOCK:
+        sessions = list(_RETRYABLE_SESSIONS.values())
+        _RETRYABLE_SESSIONS.clear()
+        executor, _ASYNC_REQUESTS_EXECUTOR = _ASYNC_REQUESTS_EXECUTOR, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+    for session in sessions:
+        session.close()
+
+
+def _reset_retryable_sessions():
+    global _RETRYABLE_SESSIONS_LOCK, _ASYNC_REQUESTS_EXECUTOR
+    # connections and threads inherited from
+    # the parent process must not be reused
+    _RETRYABLE_SESSIONS.clear()
+    _RETRYABLE_SESSIONS_LOCK = threading.Lock()
+    _ASYNC_REQUESTS_EXECUTOR = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_retryable_sessions)
+
+
 def retryable_request(
     method,
     timeout=(4, 8),
@@ -76,9 +358,11 @@ def retryable_request(
     status_forcelist=(429, 500, 502, 503, 504),
     allowed_methods=("HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE", "POST"),
     retry_kwargs=None,
+    pool_connections=10,
+    pool_maxsize=10,
     **kwargs,
 ):
-    retry_kwargs = retry_kwargs or {}
+    retry_kwargs = dict(retry_kwargs or {})
     retry_kwargs.update(
         dict(
             total=max_retries,
@@ -88,9 +372,62 @@ def retryable_request(
             backoff_jitter=backoff_jitter,
         )
     )
-    request_session = requests.Session()
-    retries = Retry(**retry_kwargs)
-    request_session.mount("https://", HTTPAdapter(max_retries=retries))
-    request_session.mount("http://", HTTPAdapter(max_retries=retries))
+    request_session = _get_retryable_session(
+        retry_kwargs, pool_connections, pool_maxsize
+    )
     request_method = getattr(request_session, method)
-    return request_method(timeout=timeout, **kwargs)
+    circuit_breaker = _get_circuit_breaker(kwargs.get("url"))
+    if circuit_breaker is None:
+        _record_retry_budget_request()
+        return request_method(timeout=timeout, **kwargs)
+    circuit_breaker.before_request()
+    _record_retry_budget_request()
+    try:
+        response = request_method(timeout=timeout, **kwargs)
+    except (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+        requests.exceptions.RetryError,
+    ):
+        circuit_breaker.record_failure()
+        raise
+    except Exception:
+        # errors caused by the request itself are not failures of the host
+        circuit_breaker.release_trial()
+        raise
+    if response.status_code >= 500:
+        circuit_breaker.record_failure()
+    else:
+        circuit_breaker.record_success()
+    return response
+
+
+def _get_async_requests_executor():
+    global _ASYNC_REQUESTS_EXECUTOR
+    if _ASYNC_REQUESTS_EXECUTOR is not None:
+        return _ASYNC_REQUESTS_EXECUTOR
+    from . import settings as app_settings
+
+    with _RETRYABLE_SESSIONS_LOCK:
+        if _ASYNC_REQUESTS_EXECUTOR is None:
+            _ASYNC_REQUESTS_EXECUTOR = ThreadPoolExecutor(
+                max_workers=app_settings.ASYNC_REQUESTS_MAX_WORKERS,
+                thread_name_prefix="openwisp-requests",
+            )
+        return _ASYNC_REQUESTS_EXECUTOR
+
+
+async def async_retryable_request(method, *args, **kwargs):
+    """Asynchronous counterpart of ``retryable_request``.
+
+    Accepts the same arguments of ``retryable_request``, the request
+    (including the retries and their backoff) is executed in a pool of
+    threads shared by all the callers, hence it does not block the event
+    loop and reuses the same keep-alive connections of
+    ``retryable_request``.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_async_requests_executor(),
+        partial(retryable_request, method, *args, **kwargs),
+    )
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""Benchmarks ``send_bulk_email`` against a loop of ``send_email`` calls.
+
+The messages are delivered to Django's locmem email backend, hence the
+results measure the overhead of building and rendering the messages
+rather than the network latency of an SMTP server (which
+``send_bulk_email`` also reduces by reusing a single connection).
+
+Usage (from the root directory of the repository)::
+
+    python tests/benchmarks/bulk_email.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "openwisp2.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core import mail  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from openwisp_utils.admin_theme.email import send_bulk_email, send_email  # noqa: E402
+
+
+def get_messages(size):
+    return [
+        (
+            f"Device {i} is offline",
+            f"Device {i} is offline",
+            f"<p>Device <strong>{i}</strong> is offline</p>",
+            [f"admin{i % 10}@openwisp.io"],
+            {"call_to_action_text": "Open", "call_to_action_url": f"/device/{i}/"},
+        )
+        for i in range(size)
+    ]
+
+
+def send_one_by_one(messages):
+    for message in messages:
+        send_email(*message)
+
+
+def main():
+    # uses the locmem email backend and a test database
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    print(f"{'messages':>8} {'send_email':>12} {'bulk':>12} {'speedup':>8}")
+    for size in (10, 100, 1000):
+        messages = get_messages(size)
+        results = []
+        for function in (send_one_by_one, send_bulk_email):
+            number = max(1, 1000 // size)
+            timer = timeit.Timer(lambda: function(messages))
+            results.append(min(timer.repeat(repeat=3, number=number)) / number)
+            assert len(mail.outbox) == size * number * 3
+            mail.outbox.clear()
+        single, bulk = results
+        print(
+            f"{size:>8} {single * 1000:>10.3f}ms"
+            f" {bulk * 1000:>10.3f}ms {single / bulk:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
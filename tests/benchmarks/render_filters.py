@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""Benchmarks the rendering of changelist filters with ``ow_render_filters``.
+
+Compares the current implementation, which caches the compiled filter
+templates and matches sub-filters to their parents with an index of the
+expected parameters, with the previous implementation which loaded the
+template of each filter on each render and compared each sub-filter with
+each parameter of each parent filter.
+
+Usage (from the root directory of the repository)::
+
+    python tests/benchmarks/render_filters.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "openwisp2.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.template.loader import get_template  # noqa: E402
+from django.utils.safestring import mark_safe  # noqa: E402
+from openwisp_utils.admin_theme.templatetags.ow_tags import (  # noqa: E402
+    ow_render_filters,
+)
+
+
+class Spec:
+    """Emulates the filter specs of a changelist."""
+
+    template = "admin/filter.html"
+
+    def __init__(self, index, parent_parameter_name=None):
+        self.title = f"filter {index}"
+        self.field = f"field{index}"
+        self.parent_parameter_name = parent_parameter_name
+
+    def expected_parameters(self):
+        return [f"{self.field}__related__exact", f"{self.field}__isnull"]
+
+    def choices(self, changelist):
+        yield {"selected": True, "display": "All", "query_string": "?"}
+        for value in range(5):
+            yield {"selected": False, "display": value, "query_string": f"?{value}"}
+
+
+def legacy_render_single_filter(cl, spec, total_filters, has_sub_filters=False):
+    tpl = get_template(spec.template)
+    choices = list(spec.choices(cl))
+    selected_choice = None
+    for choice in choices:
+        if choice["selected"]:
+            selected_choice = choice["display"]
+    return tpl.render(
+        {
+            "title": spec.title,
+            "choices": choices,
+            "spec": spec,
+            "show_button": total_filters > 4 or has_sub_filters,
+            "selected_choice": selected_choice,
+        }
+    )
+
+
+def legacy_render_filters(cl, filter_specs):
+    specs = list(filter_specs)
+    parent_filters = []
+    sub_filters = []
+    for spec in specs:
+        if getattr(spec, "parent_parameter_name", None) is not None:
+            sub_filters.append(spec)
+        else:
+            parent_filters.append(spec)
+    total_filters = len(parent_filters)
+    parent_to_children = {parent: [] for parent in parent_filters}
+    consumed_sub_filters = set()
+    for parent in parent_filters:
+        expected_params = parent.expected_parameters()
+        for child in sub_filters:
+            if child in consumed_sub_filters:
+                continue
+            parent_param = getattr(child, "parent_parameter_name")
+            if any(
+                p == parent_param or p.startswith(parent_param + "__")
+                for p in expected_params
+            ):
+                parent_to_children[parent].append(child)
+                consumed_sub_filters.add(child)
+    has_sub_filters = len(sub_filters) > 0
+    output = []
+    for parent in parent_filters:
+        children = parent_to_children[parent]
+        render = legacy_render_single_filter
+        if children:
+            output.append('<div class="ow-filter-group">')
+            output.append(render(cl, parent, total_filters, has_sub_filters))
+            output.append('<div class="ow-sub-filter-group">')
+            for child in children:
+                output.append(render(cl, child, total_filters, has_sub_filters))
+            output.append("</div>")
+            output.append("</div>")
+        else:
+            output.append(render(cl, parent, total_filters, has_sub_filters))
+    return mark_safe("".join(output))
+
+
+def get_specs(parents, children):
+    specs = [Spec(index) for index in range(parents)]
+    specs.extend(
+        Spec(parents + index, parent_parameter_name=f"field{index}__related")
+        for index in range(children)
+    )
+    return specs
+
+
+def main():
+    print(f"{'filters':>8} {'sub':>4} {'legacy':>12} {'current':>12} {'speedup':>8}")
+    for parents, children in ((10, 5), (40, 20), (100, 50)):
+        specs = get_specs(parents, children)
+        assert legacy_render_filters(None, specs) == ow_render_filters(None, specs)
+        results = []
+        for function in (legacy_render_filters, ow_render_filters):
+            number = max(1, 200 // parents)
+            timer = timeit.Timer(lambda: function(None, specs))
+            results.append(min(timer.repeat(repeat=3, number=number)) / number)
+        legacy, current = results
+        print(
+            f"{parents + children:>8} {children:>4} {legacy * 1000:>10.3f}ms"
+            f" {current * 1000:>10.3f}ms {legacy / current:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
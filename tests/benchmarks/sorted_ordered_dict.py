@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""Benchmarks the registration of items in ``SortedOrderedDict``.
+
+Compares the bisect based implementation used by ``MENU``,
+``DASHBOARD_CHARTS`` and ``DASHBOARD_TEMPLATES`` with the previous
+implementation which deep copied and sorted the whole mapping on each
+update.
+
+Usage (from the root directory of the repository)::
+
+    python tests/benchmarks/sorted_ordered_dict.py
+"""
+
+import os
+import random
+import sys
+import timeit
+from collections import OrderedDict
+from copy import deepcopy
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from openwisp_utils.utils import SortedOrderedDict  # noqa: E402
+
+
+class LegacySortedOrderedDict(OrderedDict):
+    def update(self, items):
+        super().update(items)
+        temp = deepcopy(self)
+        temp = sorted((temp.items()), key=lambda x: x[0])
+        self.clear()
+        super().update(temp)
+
+
+class Item:
+    """Emulates the objects registered in the menu and in the dashboard."""
+
+    def __init__(self, position):
+        self.config = {
+            "label": f"item {position}",
+            "url": f"/item/{position}/",
+            "icon": "icon",
+        }
+
+
+def register(mapping_class, positions):
+    mapping = mapping_class()
+    for position in positions:
+        mapping.update({position: Item(position)})
+    return mapping
+
+
+def main():
+    print(f"{'entries':>8} {'order':>10} {'legacy':>12} {'bisect':>12} {'speedup':>8}")
+    for size in (10, 100, 1000):
+        ordered = list(range(size))
+        shuffled = random.Random(size).sample(ordered, size)
+        for order, positions in (("ascending", ordered), ("random", shuffled)):
+            results = []
+            for mapping_class in (LegacySortedOrderedDict, SortedOrderedDict):
+                mapping = register(mapping_class, positions)
+                assert list(mapping) == ordered
+                number = max(1, 1000 // size)
+                timer = timeit.Timer(lambda: register(mapping_class, positions))
+                results.append(min(timer.repeat(repeat=3, number=number)) / number)
+            legacy, current = results
+            print(
+                f"{size:>8} {order:>10} {legacy * 1000:>10.3f}ms"
+                f" {current * 1000:>10.3f}ms {legacy / current:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import importlib.metadata
 from unittest.mock import MagicMock, patch
 
 from django.contrib import admin
@@ -5,21 +6,27 @@ from django.contrib.admin import SimpleListFilter
 from django.contrib.admin.sites import AdminSite
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
 from django.http import HttpRequest
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.timezone import now, timedelta
 from freezegun import freeze_time
 from openwisp_utils.admin import CopyableFieldError, CopyableFieldsAdmin, ReadOnlyAdmin
 from openwisp_utils.admin_theme import settings as admin_theme_settings
+from openwisp_utils.admin_theme import system_info
 from openwisp_utils.admin_theme.apps import OpenWispAdminThemeConfig, _staticfy
 from openwisp_utils.admin_theme.checks import admin_theme_settings_checks
+from openwisp_utils.admin_theme.context_processor import menu_groups
 from openwisp_utils.admin_theme.filters import (
     InputFilter,
     SimpleInputFilter,
     SubFilterMixin,
 )
+from openwisp_utils.admin_theme.templatetags import ow_tags
 
 from ..admin import BookAdmin, CreatedSubFilter, ProjectAdmin, ShelfAdmin
 from ..models import (
@@ -240,6 +247,25 @@ class TestAdmin(AdminTestMixin, CreateMixin, TestCase):
         response = self.client.get(url)
         self.assertContains(response, '<span class="shelf icon">')
 
+    def test_context_processor_lazy_menu(self):
+        request = HttpRequest()
+        request.user = User.objects.get(username="administrator")
+        with patch(
+            "openwisp_utils.admin_theme.context_processor.build_menu_groups",
+            return_value=[{"label": "Home"}],
+        ) as build_menu_groups, patch(
+            "openwisp_utils.admin_theme.context_processor.build_menu",
+            return_value=[],
+        ) as build_menu:
+            context = menu_groups(request)
+            build_menu_groups.assert_not_called()
+            build_menu.assert_not_called()
+            self.assertEqual(list(context["openwisp_menu_groups"]), [{"label": "Home"}])
+            build_menu_groups.assert_called_once_with(request)
+            build_menu.assert_not_called()
+            self.assertEqual(len(context["openwisp_menu_items"]), 0)
+            build_menu.assert_called_once_with(request)
+
     def test_superuser_always_sees_menu_items(self):
         url = reverse("admin:index")
         r = self.client.get(url)
@@ -621,6 +647,123 @@ class TestAdmin(AdminTestMixin, CreateMixin, TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
 
+    @patch.object(admin_theme_settings, "AUTOCOMPLETE_FILTER_KEYSET_PAGINATION", True)
+    def test_ow_auto_filter_view_keyset_pagination(self):
+        shelf = self._create_shelf(name="shelf")
+        books = [
+            self._create_book(name=f"book{i}", author="author", shelf=shelf)
+            for i in range(25)
+        ]
+        books.sort(key=lambda book: book.pk)
+        url = reverse("admin:ow-auto-filter")
+        url = f"{url}?app_label=test_project&model_name=shelf&field_name=book"
+        book_table = Book._meta.db_table
+
+        with self.subTest("First page"):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertEqual(
+                [result["id"] for result in data["results"]],
+                [str(book.pk) for book in books[:20]],
+            )
+            self.assertEqual(
+                data["pagination"], {"more": True, "after": str(books[19].pk)}
+            )
+            book_queries = [
+                query["sql"]
+                for query in context.captured_queries
+                if book_table in query["sql"]
+            ]
+            self.assertEqual(len(book_queries), 1)
+            self.assertNotIn("COUNT(", book_queries[0])
+            self.assertNotIn("OFFSET", book_queries[0])
+
+        with self.subTest("Last page"):
+            response = self.client.get(f"{url}&after={books[19].pk}")
+            data = response.json()
+            self.assertEqual(
+                [result["id"] for result in data["results"]],
+                [str(book.pk) for book in books[20:]],
+            )
+            self.assertEqual(data["pagination"], {"more": False})
+
+        with self.subTest("Invalid after value"):
+            response = self.client.get(f"{url}&after=invalid")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["results"], [])
+
+        with self.subTest("Only display fields are loaded"):
+            with patch.object(
+                BookAdmin, "autocomplete_display_fields", ("name",), create=True
+            ), CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(len(response.json()["results"]), 20)
+            book_query = next(
+                query["sql"]
+                for query in context.captured_queries
+                if book_table in query["sql"]
+            )
+            self.assertIn('"name"', book_query)
+            self.assertNotIn('"author"', book_query)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    @patch.object(admin_theme_settings, "AUTOCOMPLETE_FILTER_CACHE_TIMEOUT", 60)
+    def test_ow_auto_filter_view_cache(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        shelf = self._create_shelf(name="shelf")
+        self._create_book(name="book1", author="author", shelf=shelf)
+        url = reverse("admin:ow-auto-filter")
+        url = f"{url}?app_label=test_project&model_name=shelf&field_name=book"
+        book_table = Book._meta.db_table
+
+        def _get_results(url):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            book_queries = [
+                query
+                for query in context.captured_queries
+                if book_table in query["sql"]
+            ]
+            return [r["text"] for r in response.json()["results"]], len(book_queries)
+
+        self.assertEqual(_get_results(url)[0], ["book1"])
+        with self.subTest("Results are cached"):
+            self.assertEqual(_get_results(url), (["book1"], 0))
+
+        with self.subTest("Each term is cached separately"):
+            self.assertEqual(_get_results(f"{url}&term=none"), ([], 1))
+
+        with self.subTest("Cache is invalidated when objects are saved"):
+            self._create_book(name="book2", author="author", shelf=shelf)
+            results, queries = _get_results(url)
+            self.assertEqual(sorted(results), ["book1", "book2"])
+            self.assertNotEqual(queries, 0)
+
+        with self.subTest("Cache is invalidated when objects are deleted"):
+            Book.objects.get(name="book2").delete()
+            self.assertEqual(_get_results(url)[0], ["book1"])
+
+        with self.subTest("Each user has its own cache"):
+            user = User.objects.create_superuser(
+                username="superuser2", password="pass", email="super2@email"
+            )
+            self.client.force_login(user)
+            results, queries = _get_results(url)
+            self.assertEqual(results, ["book1"])
+            self.assertNotEqual(queries, 0)
+
+        with self.subTest("Permission is checked on cached results"):
+            user.is_superuser = False
+            user.save()
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 403)
+
     def test_ow_autocomplete_filter_uuid_exception(self):
         url = reverse("admin:test_project_book_changelist")
         url = f"{url}?shelf__id=invalid"
@@ -730,6 +873,49 @@ class TestAdmin(AdminTestMixin, CreateMixin, TestCase):
             self.assertNotContains(response, "<h2>OpenWISP Version")
             _assert_system_information(response)
 
+    def test_system_information_cache(self):
+        system_info.clear_system_info_cache()
+        self.addCleanup(system_info.clear_system_info_cache)
+        distributions = importlib.metadata.distributions()
+        expected = {
+            dist.name: dist.version
+            for dist in distributions
+            if dist.name.startswith("openwisp")
+            or dist.name in system_info.EXTRA_OPENWISP_PACKAGES
+        }
+        with patch.object(
+            importlib.metadata,
+            "PathDistribution",
+            wraps=importlib.metadata.PathDistribution,
+        ) as mocked_dist:
+            self.assertEqual(system_info.get_installed_openwisp_packages(), expected)
+            self.assertEqual(mocked_dist.call_count, len(expected))
+            mocked_dist.reset_mock()
+            self.assertEqual(system_info.get_installed_openwisp_packages(), expected)
+            system_info.get_enabled_openwisp_modules()
+            mocked_dist.assert_not_called()
+        self.assertEqual(
+            sorted(system_info.get_installed_openwisp_package_names()),
+            sorted(expected),
+        )
+        with self.subTest("Returned values can be modified safely"):
+            system_info.get_installed_openwisp_packages().clear()
+            system_info.get_os_details().clear()
+            self.assertEqual(system_info.get_installed_openwisp_packages(), expected)
+            self.assertIn("os_version", system_info.get_os_details())
+
+        with self.subTest("Enabled modules follow INSTALLED_APPS"):
+            with patch.object(
+                system_info.settings, "INSTALLED_APPS", ["openwisp_utils.admin_theme"]
+            ):
+                self.assertIn(
+                    "openwisp-utils", system_info.get_enabled_openwisp_modules()
+                )
+            with patch.object(system_info.settings, "INSTALLED_APPS", []):
+                self.assertNotIn(
+                    "openwisp-utils", system_info.get_enabled_openwisp_modules()
+                )
+
     def test_sub_filter_applies_when_parent_active(self):
         shelf = self._create_shelf(name="horror-shelf", books_type="HORROR")
         with freeze_time(now() - timedelta(days=1)):
@@ -892,3 +1078,45 @@ class TestAdmin(AdminTestMixin, CreateMixin, TestCase):
             )
         finally:
             BookAdmin.list_filter = original_list_filter
+
+    def test_render_filters_grouping(self):
+        class Spec:
+            template = "admin/filter.html"
+
+            def __init__(self, title, params, parent_parameter_name=None):
+                self.title = title
+                self.params = params
+                self.parent_parameter_name = parent_parameter_name
+
+            def expected_parameters(self):
+                return self.params
+
+            def choices(self, changelist):
+                return [{"selected": False, "display": "All", "query_string": "?"}]
+
+        specs = [
+            Spec("Parent 1", ["shelf__books_type__exact"]),
+            Spec("Parent 2", ["shelf__books_type", "name"]),
+            Spec("Child 1", ["child1"], "shelf__books_type"),
+            Spec("Child 2", ["child2"], "name"),
+            Spec("Child 3", ["child3"], "shelf"),
+        ]
+        ow_tags._get_filter_template.cache_clear()
+        self.addCleanup(ow_tags._get_filter_template.cache_clear)
+        with patch.object(
+            ow_tags, "get_template", wraps=ow_tags.get_template
+        ) as mocked_get_template:
+            output = ow_tags.ow_render_filters(None, specs)
+            ow_tags.ow_render_filters(None, specs)
+        mocked_get_template.assert_called_once_with("admin/filter.html")
+        # children are rendered after their parent,
+        # in the order in which they are defined
+        positions = [
+            output.index(f'id="choices-{spec.title.lower().replace(" ", "-")}"')
+            for spec in specs
+        ]
+        self.assertLess(positions[0], positions[2])
+        self.assertLess(positions[2], positions[4])
+        self.assertLess(positions[4], positions[1])
+        self.assertLess(positions[1], positions[3])
+        self.assertEqual(output.count('<div class="ow-filter-group">'), 2)
@@ -1,14 +1,18 @@
 from importlib import reload
+from unittest.mock import MagicMock, patch
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connection
 from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from openwisp_utils import settings as app_settings
 from openwisp_utils.api import pagination as pagination_module
-from openwisp_utils.api.pagination import OpenWispPagination
+from openwisp_utils.api.pagination import OpenWispCursorPagination, OpenWispPagination
 from rest_framework import serializers, status
+from rest_framework.exceptions import NotFound
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.request import Request
@@ -351,3 +355,155 @@ class TestOpenWispPagination(CreateMixin, TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data["count"], total)
         self.assertEqual(len(response.data["results"]), max_page_size)
+
+    def test_pagination_estimated_count(self):
+        class View:
+            pagination_estimated_count = True
+
+        pagination = OpenWispPagination()
+        queryset = Shelf.objects.order_by("id")
+        factory = APIRequestFactory()
+
+        with self.subTest("exact count is used when an estimate is not available"):
+            request = Request(factory.get(self.url, {"page": 2}))
+            paginated = pagination.paginate_queryset(queryset, request, view=View())
+            self.assertIsInstance(
+                pagination.page.paginator, pagination_module.EstimatedCountPaginator
+            )
+            self.assertEqual(len(paginated), 10)
+            self.assertEqual(pagination.page.paginator.count, 21)
+            self.assertTrue(pagination.page.has_next())
+            # the class attribute is restored for views not using the estimate
+            self.assertIs(
+                pagination.django_paginator_class,
+                OpenWispPagination.django_paginator_class,
+            )
+
+        with self.subTest("estimated count is used above the threshold"):
+            with patch.object(pagination_module, "estimate_count", return_value=5000):
+                request = Request(factory.get(self.url, {"page": 3}))
+                paginated = pagination.paginate_queryset(queryset, request, view=View())
+                response = pagination.get_paginated_response([])
+            self.assertEqual(len(paginated), 1)
+            self.assertEqual(response.data["count"], 5000)
+            # the next page is detected by fetching one more object
+            self.assertIsNone(response.data["next"])
+
+        with self.subTest("pages beyond the estimate are not rejected"):
+            with patch.object(pagination_module, "estimate_count", return_value=5):
+                request = Request(factory.get(self.url, {"page": 3}))
+                paginated = pagination.paginate_queryset(queryset, request, view=View())
+            self.assertEqual(len(paginated), 1)
+
+        with self.subTest("empty pages return 404"):
+            request = Request(factory.get(self.url, {"page": 4}))
+            with self.assertRaises(NotFound):
+                pagination.paginate_queryset(queryset, request, view=View())
+
+    def test_estimate_count(self):
+        queryset = Shelf.objects.order_by("id")
+
+        with self.subTest("other databases"):
+            self.assertIsNone(pagination_module.estimate_count(queryset))
+
+        connection = MagicMock(vendor="postgresql")
+        connection.ops.quote_name.side_effect = lambda name: f'"{name}"'
+        cursor = connection.cursor.return_value.__enter__.return_value
+        connections = {"default": connection}
+
+        with self.subTest("unfiltered queryset uses table statistics"):
+            cursor.fetchone.return_value = (4200.0,)
+            with patch.object(pagination_module, "connections", connections):
+                self.assertEqual(pagination_module.estimate_count(queryset), 4200)
+            cursor.execute.assert_called_once_with(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [f'"{Shelf._meta.db_table}"'],
+            )
+
+        cursor.reset_mock()
+
+        with self.subTest("table without statistics"):
+            cursor.fetchone.return_value = (-1.0,)
+            with patch.object(pagination_module, "connections", connections):
+                self.assertIsNone(pagination_module.estimate_count(queryset))
+
+        cursor.reset_mock()
+
+        with self.subTest("filtered querysets are not estimated"):
+            with patch.object(pagination_module, "connections", connections):
+                self.assertIsNone(
+                    pagination_module.estimate_count(queryset.filter(name="shelf1"))
+                )
+            cursor.execute.assert_not_called()
+
+        with self.subTest("filtered querysets are counted exactly"):
+
+            class View:
+                pagination_estimated_count = True
+
+            cursor.fetchone.return_value = (4200.0,)
+            pagination = OpenWispPagination()
+            request = Request(APIRequestFactory().get(self.url))
+            with patch.object(pagination_module, "connections", connections):
+                pagination.paginate_queryset(
+                    queryset.filter(name__startswith="shelf1"), request, view=View()
+                )
+            # shelf1 and shelf10-shelf19
+            self.assertEqual(pagination.page.paginator.count, 11)
+            cursor.execute.assert_not_called()
+
+    def _walk_cursor_pages(self, pagination, queryset, view=None, **params):
+        factory = APIRequestFactory()
+        request = Request(factory.get(self.url, params))
+        pages = []
+        while True:
+            pages.append(pagination.paginate_queryset(queryset, request, view=view))
+            next_link = pagination.get_next_link()
+            if not next_link:
+                return pages
+            request = Request(factory.get(next_link))
+
+    def test_cursor_pagination(self):
+        pagination = OpenWispCursorPagination()
+        queryset = Shelf.objects.all()
+        expected = list(Shelf.objects.order_by("-created", "-id"))
+
+        with self.subTest("walk the whole collection"):
+            pages = self._walk_cursor_pages(pagination, queryset)
+            self.assertEqual(
+                [len(page) for page in pages],
+                [app_settings.API_DEFAULT_PAGE_SIZE] * 2 + [1],
+            )
+            self.assertEqual([obj for page in pages for obj in page], expected)
+            response = pagination.get_paginated_response([])
+            self.assertIsNone(response.data["next"])
+            self.assertIsNotNone(response.data["previous"])
+
+        with self.subTest("page size can be overridden by the view"):
+
+            class View:
+                pagination_page_size = 15
+
+            pages = self._walk_cursor_pages(pagination, queryset, view=View())
+            self.assertEqual([len(page) for page in pages], [15, 6])
+            # the default page size is used by views which do not override it
+            pages = self._walk_cursor_pages(pagination, queryset)
+            self.assertEqual(len(pages[0]), app_settings.API_DEFAULT_PAGE_SIZE)
+
+        with self.subTest("page size query parameter is capped"):
+            pages = self._walk_cursor_pages(pagination, queryset, page_size=4)
+            self.assertEqual([len(page) for page in pages], [4] * 5 + [1])
+            self.assertEqual([obj for page in pages for obj in page], expected)
+            with patch.object(pagination, "max_page_size", 5):
+                pages = self._walk_cursor_pages(pagination, queryset, page_size=50)
+            self.assertEqual([len(page) for page in pages], [5] * 4 + [1])
+
+        with self.subTest("page fetches do not use OFFSET"):
+            factory = APIRequestFactory()
+            request = Request(factory.get(self.url))
+            pagination.paginate_queryset(queryset, request)
+            request = Request(factory.get(pagination.get_next_link()))
+            with CaptureQueriesContext(connection) as context:
+                pagination.paginate_queryset(queryset, request)
+            self.assertEqual(len(context.captured_queries), 1)
+            self.assertNotIn("OFFSET", context.captured_queries[0]["sql"])
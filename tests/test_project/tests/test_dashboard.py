@@ -1,21 +1,34 @@
+import threading
 from collections import OrderedDict
 from copy import deepcopy
 from unittest import TestCase as UnitTestCase
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Count
 from django.test import TestCase as DjangoTestCase
+from django.test import TransactionTestCase, override_settings
 from django.urls import reverse
 from django.utils.timezone import localdate, now, timedelta
 from openwisp_utils.admin_theme import (
+    dashboard,
     register_dashboard_chart,
     register_dashboard_template,
     unregister_dashboard_chart,
     unregister_dashboard_template,
 )
-from openwisp_utils.admin_theme.dashboard import get_dashboard_context
+from openwisp_utils.admin_theme.counters import ALL_ORGANIZATIONS, update_chart_counters
+from openwisp_utils.admin_theme.dashboard import (
+    DASHBOARD_CHARTS,
+    DashboardChart,
+    get_dashboard_context,
+)
+from openwisp_utils.admin_theme.models import DashboardChartCounter
+from openwisp_utils.admin_theme.tasks import update_dashboard_chart_counters
 
-from ..models import Operator, Project, RadiusAccounting
+from ..models import Operator, Project, RadiusAccounting, Shelf
 from . import AdminTestMixin, CreateMixin
 from .utils import MockRequest, MockUser
 
@@ -74,6 +87,54 @@ class TestDashboardSchema(UnitTestCase):
                 "custom_css_classes must be either a list or a tuple",
             )
 
+    @patch("openwisp_utils.admin_theme.dashboard.DASHBOARD_CHARTS", OrderedDict())
+    def test_compiled_dashboard_chart(self):
+        from openwisp_utils.admin_theme.dashboard import DASHBOARD_CHARTS
+
+        config = {
+            "name": "Test Chart",
+            "query_params": {
+                "app_label": "test_project",
+                "model": "operator",
+                "group_by": "project__name",
+            },
+            "labels": {"Utils": "<b>Utils</b>"},
+            "main_filters": {"first_name": "test"},
+            "cache_timeout": 10,
+        }
+        register_dashboard_chart(-1, config)
+        chart = DASHBOARD_CHARTS[-1]
+        self.assertIsInstance(chart, DashboardChart)
+        self.assertEqual(chart["name"], "Test Chart")
+        self.assertEqual(dict(chart), config)
+        self.assertIs(chart.model, Operator)
+        self.assertEqual(chart.labels, {"Utils": "&lt;b&gt;Utils&lt;/b&gt;"})
+        self.assertEqual(
+            chart.get_target_link(),
+            "/admin/test_project/operator/?first_name=test&project__name__exact=",
+        )
+        self.assertNotIn("main_filters", chart.context)
+        self.assertNotIn("cache_timeout", chart.context)
+
+        with self.subTest("Chart is not affected by changes to the config"):
+            config["name"] = "Changed"
+            self.assertEqual(chart.name, "Test Chart")
+
+        with self.subTest("Chart is read-only"):
+            with self.assertRaises(TypeError):
+                chart["name"] = "Changed"
+
+        with self.subTest("Callable main_filters are evaluated on each call"):
+            calls = []
+
+            def _main_filter():
+                calls.append(1)
+                return len(calls)
+
+            chart = DashboardChart(-2, {**config, "main_filters": {"n": _main_filter}})
+            self.assertIn("?n=1&", chart.get_target_link())
+            self.assertIn("?n=2&", chart.get_target_link())
+
     def test_miscellaneous_DASHBOARD_CHARTS_validation(self):
         with self.subTest("Registering with incomplete config"):
             with self.assertRaises(AssertionError):
@@ -321,3 +382,459 @@ class TestAdminDashboard(AdminTestMixin, CreateMixin, DjangoTestCase):
         final_url = target_chart["target_link"] + filters[filter_index]
         self.assertNotIn("&I", final_url.split("=", 1)[-1])
         self.assertIn("%26", final_url)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    @patch("openwisp_utils.admin_theme.settings.DASHBOARD_CACHE_TIMEOUT", 60)
+    def test_dashboard_chart_cache(self):
+        project = Project.objects.create(name="Utils")
+        Operator.objects.create(project=project, first_name="test", last_name="test")
+        superuser_request = MockRequest(user=MockUser(is_superuser=True))
+        cache.clear()
+
+        def _get_operator_count(request):
+            context = get_dashboard_context(request)
+            return sum(context["dashboard_charts"][0]["query_params"]["values"])
+
+        operator_count = Operator.objects.count()
+
+        with self.subTest("Query results are cached"):
+            self.assertEqual(_get_operator_count(superuser_request), operator_count)
+            Operator.objects.create(project=project, first_name="op", last_name="op")
+            with self.assertNumQueries(0):
+                context = get_dashboard_context(superuser_request)
+            self.assertEqual(
+                sum(context["dashboard_charts"][0]["query_params"]["values"]),
+                operator_count,
+            )
+            self.assertNotIn("cache_timeout", context["dashboard_charts"][0])
+
+        with self.subTest("Cache is separated by managed organizations"):
+            user = MockUser(is_superuser=False)
+            user.organizations_managed = []
+            self.assertEqual(
+                _get_operator_count(MockRequest(user=user)), operator_count + 1
+            )
+
+        with self.subTest("Chart cache_timeout overrides the default"):
+            chart = DashboardChart(0, {**DASHBOARD_CHARTS[0], "cache_timeout": 0})
+            with patch.dict(DASHBOARD_CHARTS, {0: chart}):
+                self.assertEqual(
+                    _get_operator_count(superuser_request), operator_count + 1
+                )
+
+    def test_cache_timeout_validation(self):
+        config = {
+            "name": "Test Chart",
+            "query_params": {
+                "app_label": "test_project",
+                "model": "operator",
+                "group_by": "project__name",
+            },
+            "cache_timeout": -1,
+        }
+        with self.assertRaises(AssertionError) as ctx:
+            register_dashboard_chart(-1, config)
+        self.assertEqual(str(ctx.exception), "cache_timeout must be a positive integer")
+
+    def test_dashboard_chart_view(self):
+        project = Project.objects.create(name="Utils")
+        Operator.objects.create(project=project, first_name="test", last_name="test")
+        operator_count = Operator.objects.count()
+
+        with self.subTest("Chart data is returned in JSON format"):
+            response = self.client.get(reverse("admin:ow-dashboard-chart", args=[0]))
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertEqual(data["name"], "Operator Project Distribution")
+            self.assertEqual(sum(data["query_params"]["values"]), operator_count)
+            self.assertIn("Utils", data["query_params"]["labels"])
+            self.assertEqual(
+                data["target_link"],
+                "/admin/test_project/operator/?project__name__exact=",
+            )
+
+        with self.subTest("Chart not registered"):
+            response = self.client.get(reverse("admin:ow-dashboard-chart", args=[-100]))
+            self.assertEqual(response.status_code, 404)
+
+        with self.subTest("Dashboard disabled"):
+            with patch(
+                "openwisp_utils.admin_theme.settings.ADMIN_DASHBOARD_ENABLED", False
+            ):
+                response = self.client.get(
+                    reverse("admin:ow-dashboard-chart", args=[0])
+                )
+            self.assertEqual(response.status_code, 404)
+
+        with self.subTest("Login required"):
+            self.client.logout()
+            response = self.client.get(reverse("admin:ow-dashboard-chart", args=[0]))
+            self.assertEqual(response.status_code, 302)
+
+    @patch("openwisp_utils.admin_theme.settings.DASHBOARD_ASYNC_CHARTS", True)
+    def test_dashboard_async_charts(self):
+        with self.assertNumQueries(0):
+            context = get_dashboard_context(
+                MockRequest(user=MockUser(is_superuser=True))
+            )
+        self.assertEqual(
+            context["dashboard_charts"][0],
+            {
+                "name": "Operator Project Distribution",
+                "data_url": reverse("admin:ow-dashboard-chart", args=[0]),
+            },
+        )
+        response = self.client.get(reverse("admin:index"))
+        self.assertContains(response, "/admin/dashboard-chart/3/")
+        self.assertNotContains(response, "'query_params'")
+
+    @patch("openwisp_utils.admin_theme.dashboard.DASHBOARD_CHARTS", OrderedDict())
+    def test_merged_chart_queries(self):
+        self._create_radius_accounting(session_id="1", start_time=now())
+        self._create_radius_accounting(
+            session_id="2", start_time=now(), stop_time=now()
+        )
+        self._create_radius_accounting(
+            session_id="3", start_time=now() - timedelta(days=2), stop_time=now()
+        )
+        for position, name, qs_filter in [
+            (0, "Open sessions", {"stop_time__isnull": True}),
+            (1, "Closed sessions", {"stop_time__isnull": False}),
+            (2, "Today sessions", {"start_time__date": localdate}),
+        ]:
+            register_dashboard_chart(
+                position,
+                {
+                    "name": name,
+                    "query_params": {
+                        "app_label": "test_project",
+                        "model": "radiusaccounting",
+                        "filter": qs_filter,
+                        "aggregate": {"total": Count("id")},
+                    },
+                    "colors": {"total": "red"},
+                    "labels": {"total": name},
+                },
+            )
+        register_dashboard_chart(
+            3,
+            {
+                "name": "Projects with operators",
+                "query_params": {
+                    "app_label": "test_project",
+                    "model": "project",
+                    "filter": {"operator__isnull": False},
+                    "aggregate": {"total": Count("id")},
+                },
+                "colors": {"total": "red"},
+                "labels": {"total": "Projects with operators"},
+            },
+        )
+        register_dashboard_chart(
+            4,
+            {
+                "name": "All projects",
+                "query_params": {
+                    "app_label": "test_project",
+                    "model": "project",
+                    "filter": {"name__isnull": False},
+                    "aggregate": {"total": Count("id")},
+                },
+                "colors": {"total": "red"},
+                "labels": {"total": "All projects"},
+            },
+        )
+        request = MockRequest(user=MockUser(is_superuser=True))
+        with patch(
+            "openwisp_utils.admin_theme.settings.DASHBOARD_MERGE_QUERIES", False
+        ):
+            with self.assertNumQueries(5):
+                expected = get_dashboard_context(request)["dashboard_charts"]
+        self.assertEqual(expected[0]["query_params"]["values"], [1])
+        self.assertEqual(expected[1]["query_params"]["values"], [2])
+        self.assertEqual(expected[2]["query_params"]["values"], [2])
+        # charts filtering on relations are not merged
+        with self.assertNumQueries(3):
+            context = get_dashboard_context(request)
+        self.assertEqual(context["dashboard_charts"], expected)
+
+
+class TestDashboardConcurrentQueries(CreateMixin, TransactionTestCase):
+    def test_concurrent_queries(self):
+        project = Project.objects.create(name="Utils")
+        Operator.objects.create(project=project, first_name="test", last_name="test")
+        request = MockRequest(user=MockUser(is_superuser=True))
+        expected = get_dashboard_context(request)["dashboard_charts"]
+        thread_ids = set()
+        execute_chart_query = dashboard._execute_chart_query
+
+        def _execute_chart_query(*args, **kwargs):
+            thread_ids.add(threading.get_ident())
+            return execute_chart_query(*args, **kwargs)
+
+        with patch(
+            "openwisp_utils.admin_theme.settings.DASHBOARD_CONCURRENT_QUERIES", 4
+        ), patch.object(
+            dashboard, "_execute_chart_query", side_effect=_execute_chart_query
+        ):
+            context = get_dashboard_context(request)
+        self.assertEqual(context["dashboard_charts"], expected)
+        self.assertNotIn(threading.get_ident(), thread_ids)
+
+    def test_concurrent_queries_error(self):
+        register_dashboard_chart(
+            -1,
+            {
+                "name": "Test Chart",
+                "query_params": {
+                    "app_label": "app_label",
+                    "model": "model_name",
+                    "group_by": "property",
+                },
+            },
+        )
+        self.addCleanup(unregister_dashboard_chart, "Test Chart")
+        request = MockRequest(user=MockUser(is_superuser=True))
+        with patch(
+            "openwisp_utils.admin_theme.settings.DASHBOARD_CONCURRENT_QUERIES", 4
+        ):
+            with self.assertRaises(ImproperlyConfigured):
+                get_dashboard_context(request)
+
+
+class TestDashboardChartCounters(DjangoTestCase):
+    def setUp(self):
+        patcher = patch(
+            "openwisp_utils.admin_theme.dashboard.DASHBOARD_CHARTS", OrderedDict()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        register_dashboard_chart(
+            0,
+            {
+                "name": "Operator last names",
+                "query_params": {
+                    "app_label": "test_project",
+                    "model": "operator",
+                    "group_by": "last_name",
+                    "organization_field": "project_id",
+                },
+                "materialized": True,
+            },
+        )
+        self.addCleanup(unregister_dashboard_chart, "Operator last names")
+        self.chart = dashboard.DASHBOARD_CHARTS[0]
+        Operator.objects.all().delete()
+        self.project1 = Project.objects.create(name="project1")
+        self.project2 = Project.objects.create(name="project2")
+
+    def _get_counters(self):
+        return DashboardChartCounter.objects.filter(
+            chart=self.chart.counter_key
+        ).exclude(organization_id=ALL_ORGANIZATIONS)
+
+    def _get_values(self, request):
+        chart = get_dashboard_context(request)["dashboard_charts"][0]
+        return dict(
+            zip(chart["query_params"]["labels"], chart["query_params"]["values"])
+        )
+
+    def _create_operators(self):
+        # counters computed when the dashboard was opened the first time
+        update_chart_counters(self.chart)
+        with self.captureOnCommitCallbacks(execute=True):
+            Operator.objects.create(project=self.project1, last_name="a")
+            Operator.objects.create(project=self.project1, last_name="b")
+            Operator.objects.create(project=self.project2, last_name="a")
+
+    def test_counters_updated_on_save_and_delete(self):
+        self._create_operators()
+        self.assertEqual(
+            self._get_counters().count(),
+            3,
+        )
+        superuser_request = MockRequest(user=MockUser(is_superuser=True))
+        with self.assertNumQueries(2):
+            self.assertEqual(self._get_values(superuser_request), {"a": 2, "b": 1})
+
+        with self.subTest("Counters are filtered by organization"):
+            user = MockUser(is_superuser=False)
+            user.organizations_managed = [self.project2.pk]
+            self.assertEqual(self._get_values(MockRequest(user=user)), {"a": 1})
+
+        with self.subTest("Counters are updated on delete"):
+            with self.captureOnCommitCallbacks(execute=True):
+                Operator.objects.filter(last_name="b").get().delete()
+            self.assertEqual(self._get_values(superuser_request), {"a": 2})
+
+    def test_counters_updated_on_organization_change(self):
+        self._create_operators()
+        superuser_request = MockRequest(user=MockUser(is_superuser=True))
+        user = MockUser(is_superuser=False)
+        user.organizations_managed = [self.project1.pk]
+        operator = Operator.objects.get(project=self.project1, last_name="a")
+        operator.project = self.project2
+        with self.captureOnCommitCallbacks(execute=True):
+            operator.save()
+        self.assertEqual(self._get_values(superuser_request), {"a": 2, "b": 1})
+        self.assertEqual(self._get_values(MockRequest(user=user)), {"b": 1})
+        user.organizations_managed = [self.project2.pk]
+        self.assertEqual(self._get_values(MockRequest(user=user)), {"a": 2})
+
+    @patch(
+        "openwisp_utils.admin_theme.tasks.update_dashboard_chart_counters.apply_async"
+    )
+    def test_update_scheduling(self, mocked_apply_async):
+        operator = Operator.objects.create(project=self.project1, last_name="a")
+
+        with self.subTest("Update is scheduled after commit for the organization"):
+            with self.captureOnCommitCallbacks(execute=True):
+                operator.save()
+            mocked_apply_async.assert_called_once_with(
+                args=[0, str(self.project1.pk)], countdown=10
+            )
+            mocked_apply_async.reset_mock()
+
+        with self.subTest("Fields unrelated to the chart do not trigger updates"):
+            with self.captureOnCommitCallbacks(execute=True):
+                operator.save(update_fields=["first_name"])
+            mocked_apply_async.assert_not_called()
+
+        with self.subTest("Related fields trigger updates"):
+            with self.captureOnCommitCallbacks(execute=True):
+                operator.save(update_fields=["project"])
+            mocked_apply_async.assert_called_once()
+            mocked_apply_async.reset_mock()
+
+        with self.subTest("Both organizations are updated when moving objects"):
+            operator.project = self.project2
+            with self.captureOnCommitCallbacks(execute=True):
+                operator.save(update_fields=["project"])
+            self.assertEqual(
+                [call.kwargs["args"] for call in mocked_apply_async.call_args_list],
+                [[0, str(self.project2.pk)], [0, str(self.project1.pk)]],
+            )
+            mocked_apply_async.reset_mock()
+
+        with self.subTest("Unregistered charts do not trigger updates"):
+            unregister_dashboard_chart("Operator last names")
+            self.addCleanup(register_dashboard_chart, 0, dict(self.chart))
+            with self.captureOnCommitCallbacks(execute=True):
+                operator.save()
+            mocked_apply_async.assert_not_called()
+
+    def test_counters_not_computed(self):
+        with patch(
+            "openwisp_utils.admin_theme.tasks.update_dashboard_chart_counters.apply_async"
+        ):
+            Operator.objects.create(project=self.project1, last_name="a")
+        request = MockRequest(user=MockUser(is_superuser=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self._get_values(request), {"a": 1})
+        # the full update of the counters has been triggered
+        self.assertEqual(
+            self._get_counters().count(),
+            1,
+        )
+
+    def test_counters_partially_computed(self):
+        with patch(
+            "openwisp_utils.admin_theme.tasks.update_dashboard_chart_counters"
+            ".apply_async"
+        ):
+            Operator.objects.create(project=self.project1, last_name="a")
+            Operator.objects.create(project=self.project2, last_name="a")
+            Operator.objects.create(project=self.project2, last_name="b")
+        # an object is saved before the dashboard is opened the first time
+        with self.captureOnCommitCallbacks(execute=True):
+            Operator.objects.create(project=self.project1, last_name="c")
+        self.assertEqual(self._get_counters().count(), 2)
+        request = MockRequest(user=MockUser(is_superuser=True))
+        expected = {"a": 2, "b": 1, "c": 1}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self._get_values(request), expected)
+        # the full update of the counters has been triggered
+        self.assertEqual(self._get_counters().count(), 4)
+        with self.assertNumQueries(2):
+            self.assertEqual(self._get_values(request), expected)
+
+    def test_full_update(self):
+        self._create_operators()
+        DashboardChartCounter.objects.all().delete()
+        update_dashboard_chart_counters.delay()
+        self.assertEqual(
+            self._get_counters().count(),
+            3,
+        )
+
+    def test_counters_without_organization(self):
+        register_dashboard_chart(
+            1,
+            {
+                "name": "Shelf types",
+                "query_params": {
+                    "app_label": "test_project",
+                    "model": "shelf",
+                    "group_by": "books_type",
+                    "organization_field": "owner_id",
+                },
+                "materialized": True,
+            },
+        )
+        self.addCleanup(unregister_dashboard_chart, "Shelf types")
+        chart = dashboard.DASHBOARD_CHARTS[1]
+        owner = get_user_model().objects.create(username="owner")
+        Shelf.objects.create(name="shared", books_type="HORROR")
+        Shelf.objects.create(name="owned", books_type="HORROR", owner=owner)
+        update_chart_counters(chart)
+        counters = DashboardChartCounter.objects.filter(
+            chart=chart.counter_key
+        ).exclude(organization_id=ALL_ORGANIZATIONS)
+        # marks the counters of the owner to verify they are not re-computed
+        counters.filter(organization_id=str(owner.pk)).update(count=99)
+
+        with patch(
+            "openwisp_utils.admin_theme.tasks.update_dashboard_chart_counters"
+            ".apply_async"
+        ) as mocked_apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                Shelf.objects.create(name="shared2", books_type="FANTASY")
+        mocked_apply_async.assert_called_once_with(args=[1, None], countdown=10)
+
+        update_dashboard_chart_counters(1, None)
+        self.assertEqual(
+            set(counters.values_list("organization_id", "group", "count")),
+            {
+                (None, "HORROR", 1),
+                (None, "FANTASY", 1),
+                (str(owner.pk), "HORROR", 99),
+            },
+        )
+
+    def test_materialized_validation(self):
+        config = {
+            "name": "Test Chart",
+            "query_params": {
+                "app_label": "test_project",
+                "model": "operator",
+                "filter": {"last_name": "a"},
+                "aggregate": {"total": Count("id")},
+            },
+            "materialized": True,
+        }
+        with self.assertRaises(AssertionError) as ctx:
+            register_dashboard_chart(-1, config)
+        self.assertEqual(str(ctx.exception), "materialized charts must use group_by")
+        config["query_params"] = {
+            "app_label": "test_project",
+            "model": "operator",
+            "filter": {"last_name": localdate},
+            "group_by": "last_name",
+        }
+        with self.assertRaises(AssertionError) as ctx:
+            register_dashboard_chart(-1, config)
+        self.assertEqual(
+            str(ctx.exception), "materialized charts cannot use callable filters"
+        )
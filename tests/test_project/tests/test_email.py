@@ -1,10 +1,27 @@
 from email.mime.text import MIMEText
+from smtplib import (
+    SMTPDataError,
+    SMTPException,
+    SMTPNotSupportedError,
+    SMTPServerDisconnected,
+)
 from unittest.mock import patch
 
+from celery.exceptions import Retry
 from django.core import mail
+from django.core.cache import cache
+from django.core.mail import BadHeaderError
 from django.test import TestCase, override_settings
+from freezegun import freeze_time
+from kombu.exceptions import EncodeError, OperationalError
+from openwisp_utils.admin_theme import email as email_module
 from openwisp_utils.admin_theme import settings as app_settings
-from openwisp_utils.admin_theme.email import SMTPRecipientsRefused, send_email
+from openwisp_utils.admin_theme.email import (
+    SMTPRecipientsRefused,
+    send_bulk_email,
+    send_email,
+)
+from openwisp_utils.admin_theme.tasks import send_queued_email
 
 
 class TestEmail(TestCase):
@@ -87,3 +104,200 @@ class TestEmail(TestCase):
             mocked_logger.assert_called_once_with(
                 f"SMTP recipients refused: {recipients}"
             )
+
+    def test_send_bulk_email(self):
+        messages = [
+            (f"Alert {i}", f"Alert {i}", f"<p>Alert {i}</p>", [f"user{i}@openwisp.io"])
+            for i in range(3)
+        ]
+        messages.append(
+            (
+                "Alert 3",
+                "Alert 3",
+                "<p>Alert 3</p>",
+                ["user3@openwisp.io"],
+                {
+                    "call_to_action_text": "Click me",
+                    "call_to_action_url": "https://openwisp.io",
+                },
+            )
+        )
+        with patch.object(
+            email_module, "get_template", wraps=email_module.get_template
+        ) as mocked_get_template, patch.object(
+            email_module, "get_current_site", wraps=email_module.get_current_site
+        ) as mocked_get_site, patch.object(
+            email_module, "get_connection", wraps=email_module.get_connection
+        ) as mocked_get_connection:
+            failures = send_bulk_email(messages, headers={"X-Test": "1"})
+        self.assertEqual(failures, [])
+        mocked_get_connection.assert_called_once()
+        mocked_get_template.assert_called_once()
+        mocked_get_site.assert_called_once()
+        self.assertEqual(len(mail.outbox), 4)
+        for i, email in enumerate(mail.outbox):
+            self.assertEqual(email.subject, f"Alert {i}")
+            self.assertEqual(email.to, [f"user{i}@openwisp.io"])
+            self.assertEqual(email.extra_headers, {"X-Test": "1"})
+            self.assertIn(f"<p>Alert {i}</p>", email.alternatives[0][0])
+        self.assertIn("Click me", mail.outbox[3].alternatives[0][0])
+        self.assertNotIn("Click me", mail.outbox[2].alternatives[0][0])
+
+    def test_send_bulk_email_failures(self):
+        messages = [("Alert", "Alert", "", [f"user{i}@openwisp.io"]) for i in range(4)]
+        recipients_refused = SMTPRecipientsRefused({"user1@openwisp.io": ""})
+        disconnected = SMTPServerDisconnected("Connection closed")
+        send = mail.EmailMultiAlternatives.send
+        errors = iter([None, recipients_refused, disconnected, None])
+
+        def _send(email, *args, **kwargs):
+            error = next(errors)
+            if error:
+                raise error
+            return send(email, *args, **kwargs)
+
+        connection = mail.get_connection()
+        with patch.object(
+            mail.EmailMultiAlternatives, "send", autospec=True, side_effect=_send
+        ), patch.object(
+            connection, "open", wraps=connection.open
+        ) as mocked_open, patch(
+            "logging.Logger.warning"
+        ) as mocked_warning:
+            failures = send_bulk_email(messages, connection=connection)
+        self.assertEqual(
+            failures,
+            [(messages[1], recipients_refused), (messages[2], disconnected)],
+        )
+        self.assertEqual(mocked_warning.call_count, 2)
+        # the connection is opened again after the disconnection
+        self.assertEqual(mocked_open.call_count, 2)
+        self.assertEqual(
+            [email.to for email in mail.outbox],
+            [["user0@openwisp.io"], ["user3@openwisp.io"]],
+        )
+
+    def test_send_bulk_email_invalid_message(self):
+        messages = [
+            ("bad\nsubject", "Alert", "", ["user0@openwisp.io"]),
+            ("Alert", "Alert", "<p>Alert</p>", ["user1@openwisp.io"]),
+        ]
+        with patch("logging.Logger.warning") as mocked_warning:
+            failures = send_bulk_email(messages)
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(failures[0][0], messages[0])
+        self.assertIsInstance(failures[0][1], BadHeaderError)
+        mocked_warning.assert_called_once()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["user1@openwisp.io"])
+
+    @patch.object(app_settings, "OPENWISP_EMAIL_QUEUE", True)
+    def test_queued_email(self):
+        args = ("Test mail", "Test", "<p>Test</p>", ["test@openwisp.io"])
+        with self.subTest("Email is sent by the celery task"):
+            with patch.object(send_queued_email, "delay") as mocked_delay:
+                send_email(*args, extra_context={"footer": "footer"})
+            mocked_delay.assert_called_once_with(
+                *args,
+                extra_context={"footer": "footer"},
+                html_email_template="openwisp_utils/email_template.html",
+            )
+            self.assertEqual(len(mail.outbox), 0)
+            send_email(*args)
+            self.assertEqual(len(mail.outbox), 1)
+            self.assertEqual(mail.outbox.pop().to, ["test@openwisp.io"])
+
+        with self.subTest("Queue can be disabled on each call"):
+            with patch.object(send_queued_email, "delay") as mocked_delay:
+                send_email(*args, queue=False)
+            mocked_delay.assert_not_called()
+            self.assertEqual(len(mail.outbox), 1)
+            mail.outbox.pop()
+
+        with self.subTest("Email is sent directly if it cannot be serialized"):
+            with patch.object(
+                send_queued_email, "delay", side_effect=EncodeError
+            ), patch("logging.Logger.warning") as mocked_warning:
+                send_email(*args, attachments=[MIMEText("Test attachment")])
+            mocked_warning.assert_called_once()
+            self.assertEqual(len(mail.outbox), 1)
+            mail.outbox.pop()
+
+        with self.subTest("Email is sent directly if the broker is not reachable"):
+            with patch.object(
+                send_queued_email,
+                "delay",
+                side_effect=OperationalError("Connection refused"),
+            ), patch("logging.Logger.warning") as mocked_warning:
+                send_email(*args)
+            mocked_warning.assert_called_once()
+            self.assertEqual(len(mail.outbox), 1)
+
+    def test_queued_email_retry(self):
+        args = ("Test mail", "Test", "", ["test@openwisp.io"])
+        with self.subTest("Transient errors are retried"):
+            for error in (
+                SMTPRecipientsRefused({"test@openwisp.io": (450, b"Mailbox busy")}),
+                SMTPDataError(421, b"Service not available"),
+                SMTPServerDisconnected("Connection closed"),
+                ConnectionRefusedError(),
+            ):
+                with patch(
+                    "django.core.mail.EmailMultiAlternatives.send", side_effect=error
+                ), patch.object(
+                    send_queued_email, "retry", side_effect=Retry
+                ) as mocked_retry:
+                    with self.assertRaises(Retry):
+                        send_queued_email(*args)
+                mocked_retry.assert_called_once_with(exc=error, countdown=30)
+
+        with self.subTest("Permanent errors are not retried"):
+            for error in (
+                SMTPRecipientsRefused({"test@openwisp.io": (550, b"No such user")}),
+                SMTPDataError(554, b"Rejected"),
+                SMTPNotSupportedError("SMTPUTF8 not supported"),
+                SMTPException("No suitable authentication method found"),
+            ):
+                with patch(
+                    "django.core.mail.EmailMultiAlternatives.send", side_effect=error
+                ), patch.object(send_queued_email, "retry") as mocked_retry, patch(
+                    "logging.Logger.warning"
+                ) as mocked_warning:
+                    send_queued_email(*args)
+                mocked_retry.assert_not_called()
+                mocked_warning.assert_called_once()
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    @patch.object(app_settings, "OPENWISP_EMAIL_RATE_LIMIT", 2)
+    def test_queued_email_rate_limit(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        args = ("Test mail", "Test", "", ["test@openwisp.io"])
+        queue = []
+
+        def _apply_async(args, kwargs, countdown, retries):
+            queue.append((args, kwargs, countdown, retries))
+
+        with freeze_time("2024-01-01 00:00:20") as frozen_time, patch.object(
+            send_queued_email, "apply_async", side_effect=_apply_async
+        ):
+            send_queued_email(*args)
+            send_queued_email(*args)
+            self.assertEqual(len(mail.outbox), 2)
+            # deferrals do not count as retries, even when the message
+            # is deferred more times than the task's max_retries
+            send_queued_email.apply(args, retries=4)
+            for _ in range(send_queued_email.max_retries + 1):
+                self.assertEqual(len(queue), 1)
+                queued_args, kwargs, countdown, retries = queue.pop()
+                self.assertEqual((countdown, retries), (40, 4))
+                send_queued_email.apply(queued_args, kwargs, retries=retries).get()
+            self.assertEqual(len(mail.outbox), 2)
+            # the message is sent when the rate limit window is over
+            frozen_time.tick(40)
+            queued_args, kwargs, countdown, retries = queue.pop()
+            send_queued_email.apply(queued_args, kwargs, retries=retries).get()
+        self.assertEqual(queue, [])
+        self.assertEqual(len(mail.outbox), 3)
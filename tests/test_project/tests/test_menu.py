@@ -2,14 +2,20 @@ from unittest.mock import patch
 
 from django.apps import registry
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
-from django.test import RequestFactory, TestCase
-from django.urls import reverse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import clear_url_caches, reverse, set_script_prefix
 from django.urls.exceptions import NoReverseMatch
+from django.utils.translation import get_language
+from django.utils.translation import override as translation_override
 from openwisp_utils.admin_theme.menu import (
     MenuGroup,
     MenuLink,
     ModelLink,
+    build_menu_groups,
+    invalidate_menu_cache,
     register_menu_group,
     register_menu_subitem,
 )
@@ -321,6 +327,54 @@ class TestMenuSchema(TestCase):
             context = model_link.get_context(request)
             self.assertEqual(context, None)
 
+    def test_model_link_url_resolution(self):
+        model_link = ModelLink(config=self._get_model_link_config())
+        self.assertEqual(model_link.view_perm, "test_project.view_shelf")
+        self.assertEqual(model_link.change_perm, "test_project.change_shelf")
+        url = reverse("admin:test_project_shelf_add")
+
+        with self.subTest("URL is resolved only once"):
+            with patch(
+                "openwisp_utils.admin_theme.menu.reverse", side_effect=reverse
+            ) as mocked_reverse:
+                self.assertEqual(model_link.get_url(), url)
+                self.assertEqual(model_link.get_url(), url)
+            mocked_reverse.assert_called_once()
+
+        with self.subTest("URL is resolved again after clearing URL caches"):
+            clear_url_caches()
+            with patch(
+                "openwisp_utils.admin_theme.menu.reverse", side_effect=reverse
+            ) as mocked_reverse:
+                self.assertEqual(model_link.get_url(), url)
+            mocked_reverse.assert_called_once()
+
+        with self.subTest("URL is resolved again when script prefix changes"):
+            set_script_prefix("/prefix/")
+            try:
+                self.assertEqual(model_link.get_url(), f"/prefix{url}")
+            finally:
+                set_script_prefix("/")
+            self.assertEqual(model_link.get_url(), url)
+
+        with self.subTest("URL is resolved for each language"):
+
+            def _reverse(name):
+                # emulates i18n_patterns
+                return f"/{get_language()}{reverse(name)}"
+
+            with patch(
+                "openwisp_utils.admin_theme.menu.reverse", side_effect=_reverse
+            ) as mocked_reverse:
+                with translation_override("en"):
+                    self.assertEqual(model_link.get_url(), f"/en{url}")
+                with translation_override("it"):
+                    self.assertEqual(model_link.get_url(), f"/it{url}")
+                    self.assertEqual(model_link.get_url(), f"/it{url}")
+                with translation_override("en"):
+                    self.assertEqual(model_link.get_url(), f"/en{url}")
+            self.assertEqual(mocked_reverse.call_count, 2)
+
     def test_menu_group(self):
         with self.subTest("Menu Group with invalid config"):
             with self.assertRaises(ImproperlyConfigured):
@@ -437,3 +491,88 @@ class TestMenuSchema(TestCase):
             self.assertEqual(len(context_items), 1)
             self.assertEqual(context_items[0].get("label"), link_context.get("label"))
             self.assertEqual(context_items[0].get("url"), link_context.get("url"))
+
+    def _spy_model_link_context(self):
+        return patch.object(
+            ModelLink,
+            "create_context",
+            autospec=True,
+            side_effect=ModelLink.create_context,
+        )
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    @patch("openwisp_utils.admin_theme.settings.MENU_CACHE_TIMEOUT", 60)
+    def test_build_menu_groups_cache(self):
+        cache.clear()
+        user = get_user_model().objects.create(
+            username="operator",
+            password="pass",
+            email="email@email",
+            is_staff=True,
+            is_superuser=False,
+        )
+        request = self.factory.get(reverse("admin:index"))
+        User = get_user_model()
+
+        def get_menu():
+            # a new user instance is used for each request,
+            # as it happens with real requests
+            request.user = User.objects.get(pk=user.pk)
+            return build_menu_groups(request)
+
+        def get_labels(menu):
+            return [
+                sub_item["label"]
+                for item in menu
+                for sub_item in item.get("sub_items", [item])
+            ]
+
+        with self.subTest("Menu is cached"):
+            menu = get_menu()
+            self.assertNotIn("Shelfs", get_labels(menu))
+            with self._spy_model_link_context() as create_context:
+                self.assertEqual(get_menu(), menu)
+            create_context.assert_not_called()
+
+        with self.subTest("Cache is invalidated when user permissions change"):
+            permission = Permission.objects.get(codename="view_shelf")
+            user.user_permissions.add(permission)
+            self.assertIn("Shelfs", get_labels(get_menu()))
+            user.user_permissions.remove(permission)
+            self.assertNotIn("Shelfs", get_labels(get_menu()))
+
+        with self.subTest("Cache is invalidated when group permissions change"):
+            group = Group.objects.create(name="shelf viewers")
+            user.groups.add(group)
+            self.assertNotIn("Shelfs", get_labels(get_menu()))
+            group.permissions.add(permission)
+            self.assertIn("Shelfs", get_labels(get_menu()))
+            group.delete()
+            self.assertNotIn("Shelfs", get_labels(get_menu()))
+
+        with self.subTest("Cache is invalidated when the user is changed"):
+            user.is_superuser = True
+            user.save()
+            self.assertIn("Shelfs", get_labels(get_menu()))
+
+        with self.subTest("Login does not invalidate the cache"):
+            user.save(update_fields=["last_login"])
+            with self._spy_model_link_context() as create_context:
+                get_menu()
+            create_context.assert_not_called()
+
+        with self.subTest("Menu is cached for each language"):
+            with translation_override("it"):
+                with self._spy_model_link_context() as create_context:
+                    get_menu()
+                create_context.assert_called()
+
+        with self.subTest("invalidate_menu_cache"):
+            for args in ([user], []):
+                get_menu()
+                invalidate_menu_cache(*args)
+                with self._spy_model_link_context() as create_context:
+                    get_menu()
+                create_context.assert_called()
@@ -1,9 +1,19 @@
+import asyncio
 import io
 import sys
-from unittest.mock import patch
+import threading
+from copy import deepcopy
+from http.client import HTTPMessage
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
 
+import requests
+from celery.signals import worker_shutdown
+from django.core.cache import cache
 from django.dispatch import Signal
 from django.test import TestCase, override_settings
+from django.utils.timezone import now, timedelta
+from freezegun import freeze_time
 from openwisp_utils.tests import (
     AssertNumQueriesSubTestMixin,
     TimeLoggingTestRunner,
@@ -12,8 +22,23 @@ from openwisp_utils.tests import (
     capture_stdout,
     catch_signal,
 )
-from openwisp_utils.utils import deep_merge_dicts, print_color, retryable_request
+from openwisp_utils.utils import (
+    _RESILIENCE_LOCAL_CACHE,
+    _RETRYABLE_SESSIONS,
+    CircuitOpenError,
+    SortedOrderedDict,
+    _BudgetedRetry,
+    _get_circuit_breaker,
+    _record_retry_budget_request,
+    async_retryable_request,
+    close_retryable_sessions,
+    deep_merge_dicts,
+    print_color,
+    retryable_request,
+)
+from requests.cookies import extract_cookies_to_jar
 from requests.exceptions import ConnectionError, RetryError
+from urllib3.exceptions import MaxRetryError
 from urllib3.response import HTTPResponse
 
 from ..models import Shelf
@@ -54,6 +79,47 @@ class TestUtils(TestCase):
         }
         self.assertDictEqual(deep_merge_dicts(dict1, dict2), merged)
 
+    def test_sorted_ordered_dict(self):
+        sorted_dict = SortedOrderedDict({3: "c", 1: "a"})
+        item = object()
+
+        with self.subTest("Keys are sorted on insert"):
+            sorted_dict.update({2: item, 0: "z"})
+            sorted_dict[4] = "d"
+            sorted_dict[-1] = "y"
+            self.assertEqual(list(sorted_dict), [-1, 0, 1, 2, 3, 4])
+            self.assertEqual(list(sorted_dict.values())[3], item)
+            # values are not copied
+            self.assertIs(sorted_dict[2], item)
+
+        with self.subTest("Existing keys keep their position"):
+            sorted_dict[1] = "A"
+            self.assertEqual(list(sorted_dict), [-1, 0, 1, 2, 3, 4])
+            self.assertEqual(sorted_dict[1], "A")
+
+        with self.subTest("Keys are removed"):
+            del sorted_dict[-1]
+            self.assertEqual(sorted_dict.pop(0), "z")
+            self.assertEqual(sorted_dict.pop(0, None), None)
+            self.assertEqual(sorted_dict.popitem(), (4, "d"))
+            self.assertEqual(sorted_dict.popitem(last=False), (1, "A"))
+            sorted_dict[0] = "z"
+            self.assertEqual(list(sorted_dict), [0, 2, 3])
+            with self.assertRaises(KeyError):
+                sorted_dict.pop(10)
+
+        with self.subTest("Copies are sorted"):
+            for copied in (sorted_dict.copy(), deepcopy(sorted_dict)):
+                copied[1] = "a"
+                self.assertEqual(list(copied), [0, 1, 2, 3])
+            self.assertEqual(list(sorted_dict), [0, 2, 3])
+
+        with self.subTest("Clear"):
+            sorted_dict.clear()
+            self.assertEqual(sorted_dict, {})
+            sorted_dict[1] = "a"
+            self.assertEqual(list(sorted_dict), [1])
+
     @override_settings(OPENWISP_SLOW_TEST_THRESHOLD=[0.0, 0.0])
     @capture_any_output()
     def test_time_logging_runner(self, stdout, stderr):
@@ -151,6 +217,8 @@ class TestUtils(TestCase):
 
     @patch("urllib3.util.retry.Retry.sleep")
     def test_retryable_request(self, *args):
+        close_retryable_sessions()
+        self.addCleanup(close_retryable_sessions)
         with self.subTest("Test failure to connect to server"):
             with patch(
                 "urllib3.connectionpool.HTTPConnectionPool._get_conn",
@@ -180,7 +248,7 @@ class TestUtils(TestCase):
 
         with self.subTest("Test customization with retry_kwargs"):
             with patch(
-                "openwisp_utils.utils.Retry",
+                "openwisp_utils.utils._BudgetedRetry",
             ) as mocked_retry, patch("openwisp_utils.utils.requests.Session"):
                 retryable_request(
                     method="get",
@@ -205,6 +273,250 @@ class TestUtils(TestCase):
                 )
                 self.assertEqual(mocked_retry.call_args[1]["total"], 10)
 
+    @patch("openwisp_utils.utils.requests.Session.request")
+    def test_retryable_request_session_reuse(self, mocked_request):
+        close_retryable_sessions()
+        self.addCleanup(close_retryable_sessions)
+        with self.subTest("Requests with the same policy share the session"):
+            with patch(
+                "openwisp_utils.utils.requests.Session",
+                wraps=requests.Session,
+            ) as mocked_session:
+                retryable_request("get", url="https://openwisp.org")
+                retryable_request("post", url="https://openwisp.org/test")
+                retryable_request(
+                    "get", url="https://openwisp.org", headers={"X-Test": "1"}
+                )
+            mocked_session.assert_called_once()
+            self.assertEqual(len(_RETRYABLE_SESSIONS), 1)
+
+        with self.subTest("Different policies use different sessions"):
+            retryable_request("get", url="https://openwisp.org", max_retries=1)
+            retryable_request(
+                "get",
+                url="https://openwisp.org",
+                retry_kwargs={"raise_on_redirect": False},
+            )
+            retryable_request("get", url="https://openwisp.org", pool_maxsize=20)
+            self.assertEqual(len(_RETRYABLE_SESSIONS), 4)
+
+        with self.subTest("Pool sizes are configurable"):
+            retryable_request(
+                "get", url="https://openwisp.org", pool_connections=2, pool_maxsize=5
+            )
+            session = list(_RETRYABLE_SESSIONS.values())[-1]
+            adapter = session.get_adapter("https://openwisp.org")
+            self.assertEqual(adapter._pool_connections, 2)
+            self.assertEqual(adapter._pool_maxsize, 5)
+            self.assertIs(session.get_adapter("http://openwisp.org"), adapter)
+
+        with self.subTest("Cookies are not stored in shared sessions"):
+            headers = HTTPMessage()
+            headers["Set-Cookie"] = "sessionid=secret"
+            response = SimpleNamespace(_original_response=SimpleNamespace(msg=headers))
+            request = requests.Request("GET", "https://openwisp.org/").prepare()
+            extract_cookies_to_jar(session.cookies, request, response)
+            self.assertEqual(len(session.cookies), 0)
+
+        with self.subTest("close_retryable_sessions"):
+            sessions = list(_RETRYABLE_SESSIONS.values())
+            with patch.object(requests.Session, "close") as mocked_close:
+                close_retryable_sessions()
+            self.assertEqual(mocked_close.call_count, len(sessions))
+            self.assertEqual(_RETRYABLE_SESSIONS, {})
+            worker_shutdown.send(sender=None)
+
+    @patch("urllib3.util.retry.Retry.sleep")
+    async def test_async_retryable_request(self, *args):
+        close_retryable_sessions()
+        self.addCleanup(close_retryable_sessions)
+
+        with self.subTest("Requests are executed in the shared thread pool"):
+            threads = []
+
+            def request(session, method, url, **kwargs):
+                threads.append(threading.current_thread().name)
+                return (method, url, kwargs)
+
+            with patch.object(requests.Session, "request", request):
+                response = await async_retryable_request(
+                    "get",
+                    url="https://openwisp.org",
+                    timeout=(1, 2),
+                    headers={"X-Test": "1"},
+                )
+            method, url, kwargs = response
+            self.assertEqual((method, url), ("GET", "https://openwisp.org"))
+            self.assertEqual(kwargs["timeout"], (1, 2))
+            self.assertEqual(kwargs["headers"], {"X-Test": "1"})
+            self.assertTrue(threads[0].startswith("openwisp-requests"))
+
+        with self.subTest("Requests are executed concurrently"):
+            # each request waits for the others,
+            # it would time out if requests were serialized
+            barrier = threading.Barrier(3, timeout=5)
+
+            def request(*args, **kwargs):
+                barrier.wait()
+                return "ok"
+
+            with patch.object(requests.Session, "request", side_effect=request):
+                responses = await asyncio.gather(
+                    *(
+                        async_retryable_request("get", url="https://openwisp.org")
+                        for _ in range(3)
+                    )
+                )
+            self.assertEqual(responses, ["ok", "ok", "ok"])
+
+        with self.subTest("Exceptions are propagated"):
+            with patch(
+                "openwisp_utils.utils.retryable_request",
+                side_effect=RetryError("too many 500 error responses"),
+            ) as mocked_retryable_request:
+                with self.assertRaises(RetryError):
+                    await async_retryable_request(
+                        "get", url="https://openwisp.org", max_retries=2
+                    )
+            mocked_retryable_request.assert_called_once_with(
+                "get", url="https://openwisp.org", max_retries=2
+            )
+
+
+class TestRetryableRequestResilience(TestCase):
+    url = "https://openwisp.org/api/"
+
+    def setUp(self):
+        _RESILIENCE_LOCAL_CACHE.clear()
+        self.addCleanup(_RESILIENCE_LOCAL_CACHE.clear)
+
+    @patch("openwisp_utils.settings.CIRCUIT_BREAKER_THRESHOLD", 2)
+    @patch("openwisp_utils.settings.CIRCUIT_BREAKER_RECOVERY_TIME", 60)
+    def test_circuit_breaker(self):
+        with patch.object(
+            requests.Session, "request", side_effect=ConnectionError
+        ) as mocked_request:
+            with self.subTest("Circuit is opened after consecutive failures"):
+                for _ in range(2):
+                    with self.assertRaises(ConnectionError):
+                        retryable_request("get", url=self.url)
+                self.assertEqual(mocked_request.call_count, 2)
+                with self.assertRaises(CircuitOpenError):
+                    retryable_request("get", url=self.url)
+                self.assertEqual(mocked_request.call_count, 2)
+
+            with self.subTest("Other hosts are not affected"):
+                with self.assertRaises(ConnectionError) as context:
+                    retryable_request("get", url="https://example.com/")
+                self.assertNotIsInstance(context.exception, CircuitOpenError)
+                self.assertEqual(mocked_request.call_count, 3)
+
+            with self.subTest("Failed trial request opens the circuit again"):
+                with freeze_time(now() + timedelta(seconds=61)):
+                    with self.assertRaises(ConnectionError) as context:
+                        retryable_request("get", url=self.url)
+                    self.assertNotIsInstance(context.exception, CircuitOpenError)
+                    self.assertEqual(mocked_request.call_count, 4)
+                    with self.assertRaises(CircuitOpenError):
+                        retryable_request("get", url=self.url)
+
+        with self.subTest("Only one trial request is allowed"):
+            with freeze_time(now() + timedelta(seconds=122)):
+                breaker = _get_circuit_breaker(self.url)
+                breaker.before_request()
+                with self.assertRaises(CircuitOpenError):
+                    breaker.before_request()
+                breaker.release_trial()
+
+        with self.subTest("Successful trial request closes the circuit"):
+            with freeze_time(now() + timedelta(seconds=122)), patch.object(
+                requests.Session, "request", return_value=MagicMock(status_code=200)
+            ) as mocked_request:
+                for _ in range(3):
+                    retryable_request("get", url=self.url)
+                self.assertEqual(mocked_request.call_count, 3)
+
+        with self.subTest("Server errors are failures"):
+            with patch.object(
+                requests.Session, "request", return_value=MagicMock(status_code=500)
+            ) as mocked_request:
+                for _ in range(2):
+                    retryable_request("get", url=self.url)
+                with self.assertRaises(CircuitOpenError):
+                    retryable_request("get", url=self.url)
+                self.assertEqual(mocked_request.call_count, 2)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    @patch("openwisp_utils.settings.CIRCUIT_BREAKER_THRESHOLD", 1)
+    @patch("openwisp_utils.settings.CIRCUIT_BREAKER_CACHE", "default")
+    def test_circuit_breaker_shared_cache(self):
+        cache.clear()
+        with patch.object(requests.Session, "request", side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                retryable_request("get", url=self.url)
+        self.assertTrue(cache.get("ow-circuit-breaker-openwisp.org-open"))
+        self.assertIsNone(
+            _RESILIENCE_LOCAL_CACHE.get("ow-circuit-breaker-openwisp.org-open")
+        )
+
+    def test_circuit_breaker_disabled(self):
+        self.assertIsNone(_get_circuit_breaker(self.url))
+        with patch.object(
+            requests.Session, "request", side_effect=ConnectionError
+        ) as mocked_request:
+            for _ in range(10):
+                with self.assertRaises(ConnectionError):
+                    retryable_request("get", url=self.url)
+        self.assertEqual(mocked_request.call_count, 10)
+
+    @patch("openwisp_utils.settings.RETRY_BUDGET_RATIO", 0.5)
+    @patch("openwisp_utils.settings.RETRY_BUDGET_MIN_RETRIES", 1)
+    def test_retry_budget(self):
+        retry = _BudgetedRetry(total=10, status_forcelist=(500,))
+
+        def increment(retry):
+            return retry.increment(
+                method="GET",
+                url="/",
+                response=HTTPResponse(status=500),
+            )
+
+        with self.subTest("Retries are allowed within the budget"):
+            retry = increment(retry)
+            self.assertEqual(retry.total, 9)
+
+        with self.subTest("Retries are refused when the budget is exhausted"):
+            with self.assertRaises(MaxRetryError):
+                increment(retry)
+
+        with self.subTest("Requests increase the budget"):
+            for _ in range(4):
+                _record_retry_budget_request()
+            retry = increment(retry)
+            self.assertEqual(retry.total, 8)
+
+        with self.subTest("Redirects do not use the budget"):
+            _RESILIENCE_LOCAL_CACHE.clear()
+            increment(retry)
+            response = HTTPResponse(status=302, headers={"Location": "/"})
+            retry = retry.increment(method="GET", url="/", response=response)
+            self.assertEqual(retry.total, 7)
+
+        with self.subTest("Budget is renewed in each time window"):
+            with freeze_time(now() + timedelta(seconds=20)):
+                retry = increment(retry)
+            self.assertEqual(retry.total, 6)
+
+    def test_retry_budget_disabled(self):
+        retry = _BudgetedRetry(total=10, status_forcelist=(500,))
+        for _ in range(10):
+            retry = retry.increment(
+                method="GET", url="/", response=HTTPResponse(status=500)
+            )
+        self.assertEqual(retry.total, 0)
+
 
 class TestAssertNumQueriesSubTest(AssertNumQueriesSubTestMixin, TestCase):
     def test_assert_num_queries(self):